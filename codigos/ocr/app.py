@@ -1,13 +1,7 @@
-import io
 import streamlit as st
 
-from pdf2image import convert_from_bytes
-from PIL import Image
-
-from functions import (
-    process_document,
-    display_results,
-)
+from functions import display_results
+from jobs import get_or_start_job
 
 st.set_page_config(
     page_title="OCR - RepenseAI", 
@@ -16,11 +10,8 @@ st.set_page_config(
 )
 
 
-if "pages_images" not in st.session_state:
-    st.session_state["pages_images"] = []
-
-if "processed_results" not in st.session_state:
-    st.session_state["processed_results"] = []
+if "job" not in st.session_state:
+    st.session_state["job"] = None
 
 
 st.title("OCR")
@@ -41,58 +32,78 @@ if st.button("Process Document"):
         st.error("Please upload a document first.")
         st.stop()
 
-    st.session_state["processed_results"] = []
-    st.session_state["pages_images"] = []
+    try:
+        st.session_state["job"] = get_or_start_job(
+            uploaded_file.getvalue(), uploaded_file.type, uploaded_file.name
+        )
+    except ValueError as e:
+        st.session_state["job"] = None
+        st.error(str(e))
+        st.stop()
 
-    file_bytes = uploaded_file.read()
-    file_type = uploaded_file.type
 
-    if file_type == "application/pdf":
-        st.session_state["pages_images"] = convert_from_bytes(file_bytes)
-    else:
-        st.session_state["pages_images"] = [Image.open(io.BytesIO(file_bytes))]
+job = st.session_state["job"]
 
-    if len(st.session_state["pages_images"]) > 10:
-        st.error("Please upload a document up to 10 pages.")
-        st.stop()
 
-    with st.spinner("Processing document..."):
-        try:
-            processed_data_list = process_document(file_bytes, file_type)
-            st.session_state["processed_results"] = processed_data_list
-
-            if not processed_data_list:
-                st.warning(
-                    "No data was extracted from the document or all pages were classified as 'none'."
-                )
-            elif all(not page_data for page_data in processed_data_list):
-                st.warning(
-                    "All pages were classified as 'none' or no extractable content was found."
-                )
-
-        except ValueError as e:
-            st.error(str(e))
-            st.stop()
-        except Exception as e:
-            st.error(f"An unexpected error occurred: {str(e)}")
-            print(f"Error during OCR processing: {e}")
-            st.stop()
-
-st.divider()
-
-results_to_display = [res for res in st.session_state["processed_results"] if res]
-
-if results_to_display:
-    pages_with_results_indices = [
-        idx for idx, res in enumerate(st.session_state["processed_results"]) if res
-    ]
-
-    if not pages_with_results_indices:
-        st.info("No pages with extractable content found after processing.")
-    else:
+# While a document is processing, this fragment reruns every second and shows
+# each page as soon as it is done. Once finished, it triggers a last full rerun
+# so polling stops.
+@st.fragment(run_every=1.0 if job is not None and not job.done else None)
+def show_results():
+    job = st.session_state["job"]
+    if job is None:
+        return
+
+    if job.done and st.session_state.get("job_rendered") is not job:
+        st.session_state["job_rendered"] = job
+        st.rerun()
+
+    if not job.done:
+        total = len(job.results)
+        st.progress(
+            job.completed / total if total else 1.0,
+            text=f"Processing document... {job.completed}/{total} pages done",
+        )
+
+        with st.expander("Page status"):
+            st.dataframe(
+                [
+                    {"Page": idx + 1, "Status": job.page_status(idx)}
+                    for idx in range(len(job.results))
+                ],
+                hide_index=True,
+            )
+
+    if job.error:
+        st.error(f"An unexpected error occurred: {job.error}")
+        return
+
+    if job.done:
+        if not job.results:
+            st.warning(
+                "No data was extracted from the document or all pages were classified as 'none'."
+            )
+        elif all(not page_data for page_data in job.results):
+            st.warning(
+                "All pages were classified as 'none' or no extractable content was found."
+            )
+
+        if job.metrics_summary:
+            with st.expander("Pipeline metrics"):
+                summary = job.metrics_summary
+                col1, col2 = st.columns(2)
+                col1.metric("Total cost", f"${sum(row['Cost'] for row in summary):.4f}")
+                col2.metric("Slowest stage", summary[0]["Stage"])
+                st.dataframe(summary, hide_index=True)
+
+    st.divider()
+
+    pages_with_results_indices = [idx for idx, res in enumerate(job.results) if res]
+
+    if pages_with_results_indices:
         page_selector_options = {
-            f"Page {original_idx + 1}": actual_idx
-            for actual_idx, original_idx in enumerate(pages_with_results_indices)
+            f"Page {original_idx + 1}": original_idx
+            for original_idx in pages_with_results_indices
         }
 
         selected_page_label = st.selectbox(
@@ -103,17 +114,18 @@ if results_to_display:
         st.divider()
 
         if selected_page_label is not None:
-            selected_display_idx = page_selector_options[selected_page_label]
-            current_results_to_display = results_to_display[selected_display_idx]
-            original_page_idx = pages_with_results_indices[selected_display_idx]
+            original_page_idx = page_selector_options[selected_page_label]
 
             display_results(
-                current_results_to_display,
+                job.results[original_page_idx],
                 original_page_idx,
-                st.session_state["pages_images"],
+                job.source.previews,
             )
 
-elif st.session_state["processed_results"] and not results_to_display:
-    st.info(
-        "The document was processed, but no pages yielded extractable content based on classifications."
-    )
+    elif job.done and job.results:
+        st.info(
+            "The document was processed, but no pages yielded extractable content based on classifications."
+        )
+
+
+show_results()
@@ -0,0 +1,277 @@
+"""
+Headless batch OCR runner.
+
+Processes every PDF/image found in the given directories (or listed in a
+manifest) and streams one JSON line per page to the output file. Pages already
+written with status "ok" are skipped, so an interrupted run can simply be
+restarted with the same arguments.
+
+    python batch.py documents/ --output data/batch_results.jsonl
+    python batch.py --manifest nightly.txt --workers 4 --concurrency 16
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from encoding import EncodedPage
+from functions import aindex_page, anear_duplicate_result, aprocess_page
+from metrics import set_document, set_page, stage
+
+
+FILE_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+}
+
+
+def find_documents(inputs: list[str], manifest: str = None) -> list[str]:
+    """Expand directories, files and manifest entries into a sorted list of documents."""
+    paths = list(inputs)
+    if manifest:
+        with open(manifest, encoding="utf-8") as f:
+            paths.extend(line.strip() for line in f if line.strip())
+
+    documents = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                documents.update(
+                    os.path.join(root, name)
+                    for name in files
+                    if os.path.splitext(name)[1].lower() in FILE_TYPES
+                )
+        elif os.path.splitext(path)[1].lower() in FILE_TYPES:
+            documents.add(path)
+        else:
+            print(f"Skipping unsupported input: {path}", file=sys.stderr)
+
+    return sorted(documents)
+
+
+def document_id(path: str) -> str:
+    """Content hash of a document, so renamed or moved files are not reprocessed."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def load_finished(output: str) -> set[tuple[str, int]]:
+    """(document_id, page) pairs already written successfully to `output`."""
+    finished = set()
+    if not os.path.exists(output):
+        return finished
+
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Truncated last line of an interrupted run
+
+            if record.get("status") == "ok":
+                finished.add((record["document_id"], record["page"]))
+
+    return finished
+
+
+# Process pool workers. They receive paths rather than bytes so large PDFs are
+# never pickled, and return PNG bytes that seed the page encoding cache.
+
+
+def count_pages(path: str) -> int:
+    if FILE_TYPES[os.path.splitext(path)[1].lower()] != "application/pdf":
+        return 1
+
+    return pdfinfo_from_path(path)["Pages"]
+
+
+def rasterize_page(path: str, index: int, dpi: int) -> bytes:
+    with stage("rasterize", document=path, page=index, dpi=dpi):
+        if FILE_TYPES[os.path.splitext(path)[1].lower()] == "application/pdf":
+            image = convert_from_path(
+                path, dpi=dpi, first_page=index + 1, last_page=index + 1
+            )[0]
+        else:
+            image = Image.open(path)
+
+    return EncodedPage(image).to_bytes("PNG")
+
+
+def to_json(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+
+    return str(value)
+
+
+class ResultWriter:
+    """Appends page records to a JSONL file, flushing each line."""
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = asyncio.Lock()
+
+    async def write(self, record: dict) -> None:
+        line = json.dumps(record, default=to_json, ensure_ascii=False)
+        async with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+async def process_page_job(job: dict, pool, writer: ResultWriter, dpi: int) -> str:
+    """Process and write one page; returns its status ("ok" or "error")."""
+    loop = asyncio.get_running_loop()
+    set_document(job["path"])
+    set_page(job["page"])
+
+    record = {
+        "document": job["path"],
+        "document_id": job["document_id"],
+        "page": job["page"],
+        "page_count": job["page_count"],
+    }
+
+    start = time.perf_counter()
+    try:
+        png = await loop.run_in_executor(
+            pool, rasterize_page, job["path"], job["page"], dpi
+        )
+        page = await asyncio.to_thread(EncodedPage.from_bytes, png)
+        result = await anear_duplicate_result(page)
+        if result is None:
+            # A failed classification raises, so it is never written as "ok"
+            result = await aprocess_page(page)
+            await aindex_page(page, result)
+
+        record["status"] = "error" if result.get("error") else "ok"
+        record["result"] = result
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+
+    record["elapsed"] = round(time.perf_counter() - start, 3)
+    await writer.write(record)
+    return record["status"]
+
+
+async def run(args) -> dict:
+    documents = find_documents(args.inputs, args.manifest)
+    finished = load_finished(args.output)
+    writer = ResultWriter(args.output)
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    stats = {
+        "documents": len(documents),
+        "pages": 0,
+        "errors": 0,
+        "skipped": 0,
+        "failed": 0,
+    }
+
+    async def produce(pool):
+        for path in documents:
+            try:
+                doc_id = await asyncio.to_thread(document_id, path)
+                page_count = await loop.run_in_executor(pool, count_pages, path)
+            except Exception as e:
+                print(f"Failed to open {path}: {e}", file=sys.stderr)
+                stats["failed"] += 1
+                continue
+
+            for index in range(page_count):
+                if (doc_id, index) in finished:
+                    stats["skipped"] += 1
+                    continue
+
+                await queue.put(
+                    {
+                        "path": path,
+                        "document_id": doc_id,
+                        "page": index,
+                        "page_count": page_count,
+                    }
+                )
+
+        for _ in range(args.concurrency):
+            await queue.put(None)
+
+    async def consume(pool):
+        while (job := await queue.get()) is not None:
+            if await process_page_job(job, pool, writer, args.dpi) != "ok":
+                stats["errors"] += 1
+            stats["pages"] += 1
+
+            if stats["pages"] % 50 == 0:
+                print(f"{stats['pages']} pages processed", file=sys.stderr)
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            await asyncio.gather(
+                produce(pool), *(consume(pool) for _ in range(args.concurrency))
+            )
+    finally:
+        writer.close()
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch OCR over PDFs and images")
+
+    parser.add_argument("inputs", nargs="*", help="Documents or directories to process")
+    parser.add_argument("--manifest", help="Text file with one document path per line")
+    parser.add_argument(
+        "--output",
+        default="data/batch_results.jsonl",
+        help="JSONL file receiving one record per page (appended, used for resuming)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Processes used for rasterization",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Pages extracted at the same time (provider limits still apply)",
+    )
+    parser.add_argument("--dpi", type=int, default=200)
+
+    args = parser.parse_args()
+    if not args.inputs and not args.manifest:
+        parser.error("give at least one input or --manifest")
+
+    stats = asyncio.run(run(args))
+    print(
+        f"Done: {stats['pages']} pages processed ({stats['errors']} with errors, "
+        f"retried on the next run), {stats['skipped']} skipped, "
+        f"{stats['failed']} documents failed to open ({stats['documents']} documents)"
+    )
+
+
+if __name__ == "__main__":
+    main()
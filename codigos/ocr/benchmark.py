@@ -0,0 +1,209 @@
+"""
+Offline benchmark of process_document.
+
+Record the provider responses once (this makes real API calls):
+
+    python benchmark.py images/ --mode record
+
+then replay them as often as needed, without network or API spend, to measure
+our own overhead (rasterization, encoding, orchestration) and the gain of
+running pages concurrently:
+
+    python benchmark.py images/ --workers 1 4 8 --repeat 3 --latency-scale 1.0
+
+With --api async the documents go through aprocess_document instead, which
+checks that the async API really overlaps provider calls: its speedup with more
+workers must match the sync one.
+
+The response cache, the near-duplicate index and the metrics file are disabled
+while benchmarking, so every run goes through the whole pipeline. A replay that
+misses the cassette, fails a page or returns an empty page (all of which would
+make it look faster than it is) exits with status 1; pass --allow-empty when
+the documents contain blank pages.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import metrics
+
+from batch import FILE_TYPES, find_documents
+from cache import CACHE
+from cassettes import CASSETTE
+from clients import REGISTRY
+from functions import aprocess_document, process_document
+from metrics import LOCAL_STAGES, collect, summarize
+from near_duplicates import PAGE_INDEX
+
+
+def is_empty(result: dict) -> bool:
+    """Whether a page result has no content and no error (e.g. a blank page)."""
+    return not result.get("error") and not any(
+        result.get(field) for field in ("text", "instructions", "table", "image_data")
+    )
+
+
+def run_document(path: str, workers: int, api: str = "sync") -> dict:
+    with open(path, "rb") as f:
+        file_bytes = f.read()
+
+    file_type = FILE_TYPES[os.path.splitext(path)[1].lower()]
+    misses = CASSETTE.misses
+
+    with collect(document=path) as records:
+        start = time.perf_counter()
+        if api == "async":
+            results = asyncio.run(
+                aprocess_document(file_bytes, file_type, max_workers=workers)
+            )
+        else:
+            results = process_document(file_bytes, file_type, max_workers=workers)
+        wall = time.perf_counter() - start
+
+    stages = {row["Stage"]: row["Total Time (s)"] for row in summarize(records)}
+    return {
+        "document": os.path.basename(path),
+        "workers": workers,
+        "pages": len(results),
+        "errors": sum(bool(result.get("error")) for result in results),
+        "empty": sum(is_empty(result) for result in results),
+        "misses": CASSETTE.misses - misses,
+        "wall": wall,
+        "local": sum(total for name, total in stages.items() if name in LOCAL_STAGES),
+        "provider": sum(
+            total for name, total in stages.items() if name not in LOCAL_STAGES
+        ),
+    }
+
+
+def report(runs: list[dict]) -> list[dict]:
+    """Mean wall time, throughput and speedup per number of workers."""
+    by_workers = {}
+    for run in runs:
+        by_workers.setdefault(run["workers"], []).append(run)
+
+    baseline = None
+    rows = []
+    for workers, items in sorted(by_workers.items()):
+        wall = sum(item["wall"] for item in items) / len(items)
+        pages = sum(item["pages"] for item in items) / len(items)
+        baseline = baseline or wall
+
+        rows.append(
+            {
+                "Workers": workers,
+                "Runs": len(items),
+                "Wall (s)": round(wall, 3),
+                "Pages/s": round(pages / wall, 2) if wall else None,
+                "Speedup": round(baseline / wall, 2) if wall else None,
+                "Local (s)": round(sum(item["local"] for item in items) / len(items), 3),
+                "Provider (s)": round(
+                    sum(item["provider"] for item in items) / len(items), 3
+                ),
+                "Errors": sum(item["errors"] for item in items),
+                "Empty": sum(item["empty"] for item in items),
+                "Misses": sum(item["misses"] for item in items),
+            }
+        )
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark process_document offline")
+
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")],
+        help="Documents or directories to benchmark (default: images/)",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["record", "replay"],
+        default="replay",
+        help="Record real provider responses or replay the cassette",
+    )
+    parser.add_argument("--cassette", help="Cassette path (default: data/cassette.sqlite)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument(
+        "--api",
+        choices=["sync", "async"],
+        default="sync",
+        help="Run process_document or aprocess_document",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--latency-scale",
+        type=float,
+        default=1.0,
+        help="Multiplier of the recorded latencies when replaying (0 = no latency)",
+    )
+    parser.add_argument(
+        "--latency", type=float, help="Fixed latency (seconds) of every replayed call"
+    )
+    parser.add_argument("--json", help="Also write every run to this JSON file")
+    parser.add_argument(
+        "--allow-empty",
+        action="store_true",
+        help="Do not fail a replay on empty pages (documents with blank pages)",
+    )
+
+    args = parser.parse_args()
+
+    CASSETTE.mode = args.mode
+    CASSETTE.latency_scale = args.latency_scale
+    CASSETTE.fixed_latency = args.latency
+    if args.cassette:
+        CASSETTE.path = args.cassette
+
+    REGISTRY.clear()
+    CACHE.enabled = False
+    PAGE_INDEX.enabled = False
+    metrics.METRICS_ENABLED = False
+
+    documents = find_documents(args.inputs)
+    if not documents:
+        print("No documents found", file=sys.stderr)
+        return
+
+    # Recording only needs one pass over the documents
+    workers = args.workers[:1] if args.mode == "record" else args.workers
+    repeat = 1 if args.mode == "record" else args.repeat
+
+    runs = []
+    for count in workers:
+        for _ in range(repeat):
+            for path in documents:
+                runs.append(run_document(path, count, args.api))
+
+    rows = report(runs)
+    headers = list(rows[0])
+    print("\t".join(headers))
+    for row in rows:
+        print("\t".join(str(row[header]) for header in headers))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(runs, f, indent=2)
+
+    if args.mode == "replay":
+        misses = sum(run["misses"] for run in runs)
+        errors = sum(run["errors"] for run in runs)
+        empty = 0 if args.allow_empty else sum(run["empty"] for run in runs)
+
+        if misses or errors or empty:
+            print(
+                f"Invalid replay: {misses} cassette misses, {errors} failed pages, "
+                f"{empty} empty pages (record the documents again with --mode record)",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import functools
+import threading
+
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CACHE_PATH = os.getenv(
+    "OCR_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ocr_cache.sqlite"),
+)
+
+
+def content_digest(content) -> str:
+    """Hash the pixels of an image (or raw bytes) into a hex digest."""
+    if hasattr(content, "digest"):  # EncodedPage memoizes its own digest
+        return content.digest
+
+    digest = hashlib.sha256()
+
+    if isinstance(content, Image.Image):
+        digest.update(f"{content.mode}:{content.size}".encode("utf-8"))
+        digest.update(content.tobytes())
+    elif isinstance(content, str):
+        digest.update(content.encode("utf-8"))
+    else:
+        digest.update(bytes(content))
+
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Disk-backed cache for model responses, keyed by page content and call parameters.
+
+    Entries are evicted when they are older than `max_age` seconds, and the least
+    recently used ones are dropped when the cache grows beyond `max_entries` or
+    `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        max_entries: int = 10_000,
+        max_bytes: int = 512 * 1024 * 1024,
+        max_age: float = 30 * 24 * 60 * 60,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+
+        return self._conn
+
+    @staticmethod
+    def make_key(content, **params) -> str:
+        """Build a cache key from the page content and the call parameters."""
+        serialized = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(
+            f"{content_digest(content)}:{serialized}".encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached value for `key`, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value, created FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            now = time.time()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+
+            self.conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value) -> None:
+        """Store `value` under `key` and evict old entries if needed."""
+        if not self.enabled:
+            return
+
+        data = pickle.dumps(value)
+        now = time.time()
+
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now),
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self.conn.execute("DELETE FROM cache WHERE created < ?", (now - self.max_age,))
+
+        count, total = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()
+
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        rows = self.conn.execute(
+            "SELECT key, size FROM cache ORDER BY accessed ASC"
+        ).fetchall()
+
+        expired = []
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+
+            expired.append((key,))
+            count -= 1
+            total -= size
+
+        self.conn.executemany("DELETE FROM cache WHERE key = ?", expired)
+
+    def clear(self) -> None:
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self.conn.execute("DELETE FROM cache")
+            self.conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size of the cache."""
+        with self._lock:
+            count, total = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+            ).fetchone()
+
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "entries": count,
+            "bytes": total,
+        }
+
+    def cached(self, **params):
+        """
+        Decorator caching a function whose first argument is the page content.
+
+        `params` (model, prompt, ...) and any extra call arguments are part of the
+        key. Only successful calls are stored: exceptions propagate uncached.
+        """
+
+        def decorator(func):
+            def cache_key(content, *args, **kwargs) -> str:
+                return self.make_key(
+                    content,
+                    function=func.__name__,
+                    args=args,
+                    kwargs=kwargs,
+                    **params,
+                )
+
+            @functools.wraps(func)
+            def wrapper(content, *args, **kwargs):
+                key = cache_key(content, *args, **kwargs)
+
+                value = self.get(key)
+                if value is not None:
+                    return value
+
+                value = func(content, *args, **kwargs)
+                self.set(key, value)
+                return value
+
+            # Lets batched callers read and fill the same entries
+            wrapper.cache_key = cache_key
+            return wrapper
+
+        return decorator
+
+    def shared_with(self, func):
+        """
+        Decorator for an async variant of a `cached` function.
+
+        The variant reads and fills the same entries as `func`, so sync and async
+        callers share results.
+        """
+
+        def decorator(afunc):
+            @functools.wraps(afunc)
+            async def wrapper(content, *args, **kwargs):
+                key = func.cache_key(content, *args, **kwargs)
+
+                value = self.get(key)
+                if value is not None:
+                    return value
+
+                value = await afunc(content, *args, **kwargs)
+                self.set(key, value)
+                return value
+
+            wrapper.cache_key = func.cache_key
+            return wrapper
+
+        return decorator
+
+
+CACHE = OCRCache(enabled=os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true")
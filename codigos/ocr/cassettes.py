@@ -0,0 +1,267 @@
+"""
+Record/replay layer for provider calls.
+
+In "record" mode every repenseai Task run, Mistral OCR call and Textract call
+is stored in a cassette (SQLite) with its observed latency. In "replay" mode
+the same requests are answered from the cassette without network access,
+sleeping for the recorded latency (scaled by OCR_CASSETTE_LATENCY_SCALE, or a
+fixed OCR_CASSETTE_LATENCY seconds), so the pipeline overhead can be measured
+offline. Requests missing from the cassette raise CassetteMiss (and are counted
+in `misses`).
+"""
+
+import os
+import json
+import time
+import pickle
+import sqlite3
+import asyncio
+import hashlib
+import threading
+
+from PIL import Image
+from dotenv import load_dotenv
+from repenseai.genai.tasks.api import Task as BaseTask
+
+from cache import content_digest
+from metrics import token_usage
+
+load_dotenv()
+
+CASSETTE_PATH = os.getenv(
+    "OCR_CASSETTE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cassette.sqlite"),
+)
+
+
+class CassetteMiss(KeyError):
+    """A replayed request was never recorded."""
+
+
+class Cassette:
+    def __init__(
+        self,
+        path: str = CASSETTE_PATH,
+        mode: str = "off",
+        latency_scale: float = 1.0,
+        fixed_latency: float = None,
+    ):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.fixed_latency = fixed_latency
+
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS interactions (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    response BLOB NOT NULL,
+                    tokens TEXT,
+                    latency REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+
+        return self._conn
+
+    @property
+    def active(self) -> bool:
+        return self.mode in ("record", "replay")
+
+    def save(self, key: str, provider: str, response, latency: float, tokens=None):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO interactions VALUES (?, ?, ?, ?, ?)",
+                (key, provider, pickle.dumps(response), json.dumps(tokens), latency),
+            )
+            self.conn.commit()
+
+    def load(self, key: str) -> tuple:
+        """(response, tokens, latency to inject) of a recorded request."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response, tokens, latency FROM interactions WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                raise CassetteMiss(key)
+
+        latency = row[2] * self.latency_scale
+        if self.fixed_latency is not None:
+            latency = self.fixed_latency
+
+        return pickle.loads(row[0]), json.loads(row[1]), latency
+
+    def call(self, provider: str, key: str, func, *args, **kwargs):
+        """Run `func` through the cassette: recorded, replayed or passed through."""
+        if self.mode == "replay":
+            response, _, latency = self.load(key)
+            time.sleep(latency)
+            return response
+
+        start = time.perf_counter()
+        response = func(*args, **kwargs)
+        if self.mode == "record":
+            self.save(key, provider, response, time.perf_counter() - start)
+
+        return response
+
+    async def acall(self, provider: str, key: str, afunc, *args, **kwargs):
+        """Async version of call."""
+        if self.mode == "replay":
+            response, _, latency = await asyncio.to_thread(self.load, key)
+            await asyncio.sleep(latency)
+            return response
+
+        start = time.perf_counter()
+        response = await afunc(*args, **kwargs)
+        if self.mode == "record":
+            await asyncio.to_thread(
+                self.save, key, provider, response, time.perf_counter() - start
+            )
+
+        return response
+
+
+_fixed_latency = os.getenv("OCR_CASSETTE_LATENCY")
+
+CASSETTE = Cassette(
+    mode=os.getenv("OCR_CASSETTE_MODE", "off").lower(),
+    latency_scale=float(os.getenv("OCR_CASSETTE_LATENCY_SCALE", "1.0")),
+    fixed_latency=float(_fixed_latency) if _fixed_latency else None,
+)
+
+
+def _digest(value):
+    if isinstance(value, (Image.Image, bytes, bytearray)) or hasattr(value, "digest"):
+        return content_digest(value)
+
+    return type(value).__name__
+
+
+def request_key(provider: str, **request) -> str:
+    """Deterministic key of a provider request (images and bytes by content hash)."""
+    serialized = json.dumps(request, sort_keys=True, default=_digest)
+    return hashlib.sha256(f"{provider}:{serialized}".encode("utf-8")).hexdigest()
+
+
+class ReplayAgent:
+    """
+    Stands in for a repenseai agent in replay mode; it only reports tokens.
+
+    It has no API: Task.__init__ still calls get_api, but replayed runs never
+    reach the base Task.run.
+    """
+
+    def __init__(self, model: str = None, model_type: str = "chat", **config):
+        self.model = model
+        self.model_type = model_type
+        self.config = config
+        self.tokens = None
+        self.api = None
+
+    def get_api(self):
+        return self.api
+
+
+def _task_key(task, data) -> str:
+    return request_key(
+        "task",
+        model=getattr(task.cassette_agent, "model", None),
+        user=task.cassette_request.get("user"),
+        history=task.cassette_request.get("history"),
+        data=data,
+    )
+
+
+def _tokens(agent) -> dict:
+    input_tokens, output_tokens = token_usage(agent)
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens}
+
+
+class Task(BaseTask):
+    """repenseai Task whose runs go through the cassette."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette_agent = kwargs.get("agent")
+        self.cassette_request = kwargs
+
+    def run(self, data=None):
+        if not CASSETTE.active:
+            return super().run(data)
+
+        key = _task_key(self, data)
+        if CASSETTE.mode == "replay":
+            response, tokens, latency = CASSETTE.load(key)
+            time.sleep(latency)
+            self.cassette_agent.tokens = tokens
+            return response
+
+        start = time.perf_counter()
+        response = super().run(data)
+        CASSETTE.save(
+            key,
+            "task",
+            response,
+            time.perf_counter() - start,
+            _tokens(self.cassette_agent),
+        )
+        return response
+
+
+class _RecordingOCR:
+    def __init__(self, ocr):
+        self._ocr = ocr
+
+    def process(self, **request):
+        key = request_key("mistral", **request)
+        return CASSETTE.call("mistral", key, lambda: self._ocr.process(**request))
+
+    async def process_async(self, **request):
+        key = request_key("mistral", **request)
+        return await CASSETTE.acall(
+            "mistral", key, lambda: self._ocr.process_async(**request)
+        )
+
+
+class RecordingMistral:
+    """Mistral client whose OCR calls go through the cassette."""
+
+    def __init__(self, client):
+        self._client = client
+        self.ocr = _RecordingOCR(client.ocr if client is not None else None)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class RecordingTextract:
+    """Textract client whose detect_document_text calls go through the cassette."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def detect_document_text(self, **request):
+        key = request_key("textract", **request)
+        return CASSETTE.call(
+            "textract", key, lambda: self._client.detect_document_text(**request)
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
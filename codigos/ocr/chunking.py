@@ -0,0 +1,146 @@
+import os
+import re
+import math
+import zipfile
+
+from io import BytesIO
+from typing import Iterator, NamedTuple
+from xml.etree.ElementTree import iterparse
+
+
+# Approximate token budget of each chunk sent to the model (the prompt comes on top)
+CHUNK_TOKENS = int(os.getenv("OCR_CHUNK_TOKENS", "8000"))
+
+# Rough characters per token, used to estimate sizes without a tokenizer
+CHARS_PER_TOKEN = 4
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class Paragraph(NamedTuple):
+    text: str
+    heading: bool = False
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def iter_docx_paragraphs(docx_bytes: bytes) -> Iterator[Paragraph]:
+    """
+    Stream the non-empty paragraphs of a DOCX file, in document order.
+
+    document.xml is parsed incrementally, so only the current paragraph is kept
+    in memory. Paragraphs with a heading or title style are flagged as headings.
+    """
+    with zipfile.ZipFile(BytesIO(docx_bytes)) as archive:
+        with archive.open("word/document.xml") as document:
+            for _, element in iterparse(document, events=("end",)):
+                if element.tag != f"{W}p":
+                    continue
+
+                parts = []
+                for node in element.iter():
+                    if node.tag == f"{W}t":
+                        parts.append(node.text or "")
+                    elif node.tag == f"{W}tab":
+                        parts.append("\t")
+                    elif node.tag in (f"{W}br", f"{W}cr"):
+                        parts.append("\n")
+
+                style = element.find(f"{W}pPr/{W}pStyle")
+                style = style.get(f"{W}val", "") if style is not None else ""
+                text = "".join(parts)
+                element.clear()
+
+                if text.strip():
+                    yield Paragraph(text, style.lower().startswith(("heading", "title")))
+
+
+def iter_txt_paragraphs(txt_bytes: bytes) -> Iterator[Paragraph]:
+    """Stream the blank-line separated paragraphs of a text file."""
+    try:
+        text = txt_bytes.decode("utf-8")
+    except UnicodeDecodeError:
+        text = txt_bytes.decode("latin-1")
+
+    start = 0
+    for separator in re.finditer(r"\n\s*\n", text):
+        if text[start : separator.start()].strip():
+            yield Paragraph(text[start : separator.start()])
+        start = separator.end()
+
+    if text[start:].strip():
+        yield Paragraph(text[start:])
+
+
+def iter_paragraphs(file_bytes: bytes, file_type: str) -> Iterator[Paragraph]:
+    if file_type == "docx":
+        return iter_docx_paragraphs(file_bytes)
+    if file_type == "txt":
+        return iter_txt_paragraphs(file_bytes)
+
+    raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def split_paragraph(text: str, budget: int) -> Iterator[str]:
+    """Split a paragraph larger than `budget` tokens on lines, then sentences, then characters."""
+    if estimate_tokens(text) <= budget:
+        yield text
+        return
+
+    for pattern, separator in ((r"\n", "\n"), (r"(?<=[.!?;])\s+", " ")):
+        pieces = [piece for piece in re.split(pattern, text) if piece.strip()]
+        if len(pieces) > 1:
+            yield from chunk_texts(pieces, budget, separator)
+            return
+
+    size = budget * CHARS_PER_TOKEN
+    for start in range(0, len(text), size):
+        yield text[start : start + size]
+
+
+def chunk_texts(texts, budget: int, separator: str = "\n\n") -> Iterator[str]:
+    current, used = [], 0
+    for text in texts:
+        for piece in split_paragraph(text, budget):
+            tokens = estimate_tokens(piece)
+            if current and used + tokens > budget:
+                yield separator.join(current)
+                current, used = [], 0
+
+            current.append(piece)
+            used += tokens
+
+    if current:
+        yield separator.join(current)
+
+
+def chunk_paragraphs(paragraphs, budget: int = CHUNK_TOKENS) -> Iterator[str]:
+    """
+    Group paragraphs into chunks of about `budget` tokens.
+
+    Chunks end on paragraph boundaries, preferably right before a heading once
+    half the budget is used; only paragraphs larger than the budget are split.
+    """
+    section, used = [], 0
+    for paragraph in paragraphs:
+        tokens = estimate_tokens(paragraph.text)
+        if section and (
+            used + tokens > budget or (paragraph.heading and used > budget / 2)
+        ):
+            yield from chunk_texts(section, budget)
+            section, used = [], 0
+
+        section.append(paragraph.text)
+        used += tokens
+
+    if section:
+        yield from chunk_texts(section, budget)
+
+
+def iter_text_chunks(
+    file_bytes: bytes, file_type: str, budget: int = CHUNK_TOKENS
+) -> Iterator[str]:
+    """Token-budgeted chunks of a txt or docx file, read incrementally."""
+    return chunk_paragraphs(iter_paragraphs(file_bytes, file_type), budget)
@@ -0,0 +1,117 @@
+import os
+import queue
+import boto3
+import threading
+
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from mistralai import Mistral
+from repenseai.genai.agent import Agent
+
+from cassettes import CASSETTE, RecordingMistral, RecordingTextract, ReplayAgent
+
+load_dotenv()
+
+
+def _reset_api(api):
+    """Clear the state a repenseai API object keeps from its previous request."""
+    api.response = None
+    api.tokens = None
+    return api
+
+
+class PooledAgent(Agent):
+    """
+    Agent that builds its API object, and with it the Anthropic/OpenAI SDK
+    client, only once.
+
+    repenseai's Task calls get_api() for every task, which would create a new
+    client (and TLS connection) per request. Pooled agents are leased to one
+    caller at a time, so their API object can be reused.
+    """
+
+    def get_api(self):
+        if self.api is None:
+            return super().get_api()
+
+        return _reset_api(self.api)
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of provider clients and agents.
+
+    Clients (Mistral, Textract) are thread-safe and shared by everyone. Agents are
+    kept in a pool per name and leased to one caller at a time; each one reuses
+    its API object and SDK client, so their HTTP connections stay warm across
+    pages and documents without being shared by two concurrent requests.
+
+    Only sync agents are pooled: the async API runs them in threads (see
+    ratelimit.run_limited), so no pooled client is tied to an event loop and
+    one run's agents can be reused by the next asyncio.run.
+
+    Provider calls go through the cassette (see cassettes.py); in replay mode
+    agents are ReplayAgents and no real client is created.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._agents = {}
+
+    def client(self, name: str, factory):
+        """Return the client registered under `name`, creating it on first use."""
+        with self._lock:
+            if name not in self._clients:
+                self._clients[name] = factory()
+
+            return self._clients[name]
+
+    @contextmanager
+    def _lease(self, name: str, factory):
+        with self._lock:
+            pool = self._agents.setdefault(name, queue.SimpleQueue())
+
+        try:
+            agent = pool.get_nowait()
+        except queue.Empty:
+            agent = factory()
+
+        try:
+            yield agent
+        finally:
+            pool.put(agent)
+
+    def agent(self, name: str, **config):
+        """Lease an idle Agent built with `config`, creating one if none is free."""
+        if CASSETTE.mode == "replay":
+            return self._lease(f"replay:{name}", lambda: ReplayAgent(**config))
+
+        return self._lease(name, lambda: PooledAgent(**config))
+
+    def clear(self) -> None:
+        """Drop every client and agent (they are rebuilt on next use)."""
+        with self._lock:
+            self._clients.clear()
+            self._agents.clear()
+
+
+REGISTRY = ClientRegistry()
+
+
+def mistral_client() -> RecordingMistral:
+    return REGISTRY.client(
+        "mistral",
+        lambda: RecordingMistral(Mistral(api_key=os.getenv("MISTRAL_API_KEY"))),
+    )
+
+
+def textract_client(region: str = "us-east-2") -> RecordingTextract:
+    if CASSETTE.mode == "replay":
+        return REGISTRY.client("replay:textract", lambda: RecordingTextract(None))
+
+    return REGISTRY.client(
+        f"textract:{region}",
+        lambda: RecordingTextract(boto3.client("textract", region_name=region)),
+    )
@@ -0,0 +1,118 @@
+import io
+import base64
+import threading
+
+from PIL import Image
+
+from cache import content_digest
+from metrics import stage
+
+
+# Longest side (in pixels) each provider actually uses. Larger images are
+# downscaled on the provider side anyway, so sending them only costs upload time.
+PROVIDER_MAX_SIZE = {
+    "anthropic": 1568,
+    "openai": 2048,
+    "mistral": None,
+    "textract": None,
+}
+
+MIME_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+
+class EncodedPage:
+    """
+    A page image that lazily computes and memoizes its encodings.
+
+    Every encoding (bytes, base64, data URL) and provider-sized copy is computed
+    at most once, even when several extractors use the page concurrently.
+    """
+
+    def __init__(self, image: Image.Image):
+        self.image = image
+        self._encodings = {}
+        self._variants = {}
+        self._digest = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, format: str = "PNG") -> "EncodedPage":
+        """Decode an already encoded page, reusing `data` as its `format` encoding."""
+        image = Image.open(io.BytesIO(data))
+        image.load()
+
+        page = cls(image)
+        page._encodings[format.upper()] = data
+        return page
+
+    @property
+    def digest(self) -> str:
+        """Content hash of the page pixels."""
+        with self._lock:
+            if self._digest is None:
+                self._digest = content_digest(self.image)
+            return self._digest
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.image.size
+
+    def to_bytes(self, format: str = "PNG") -> bytes:
+        """Encoded image bytes in the given format."""
+        format = format.upper()
+        with self._lock:
+            if format not in self._encodings:
+                image = self.image
+                if format == "JPEG" and image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+
+                with stage("encode", format=format, size=image.size) as record:
+                    buffered = io.BytesIO()
+                    image.save(buffered, format=format)
+                    self._encodings[format] = buffered.getvalue()
+                    record["bytes"] = len(self._encodings[format])
+
+            return self._encodings[format]
+
+    def to_base64(self, format: str = "PNG") -> str:
+        """Base64 string of the encoded image."""
+        format = format.upper()
+        key = f"{format}:base64"
+        with self._lock:
+            if key not in self._encodings:
+                self._encodings[key] = base64.b64encode(
+                    self.to_bytes(format)
+                ).decode("utf-8")
+
+            return self._encodings[key]
+
+    def data_url(self, format: str = "PNG") -> str:
+        """Data URL of the encoded image."""
+        format = format.upper()
+        return f"data:{MIME_TYPES[format]};base64,{self.to_base64(format)}"
+
+    def for_provider(self, provider: str) -> "EncodedPage":
+        """Copy of the page downscaled to the provider's useful maximum resolution."""
+        max_size = PROVIDER_MAX_SIZE.get(provider)
+        if max_size is None or max(self.image.size) <= max_size:
+            return self
+
+        with self._lock:
+            if max_size not in self._variants:
+                resized = self.image.copy()
+                resized.thumbnail((max_size, max_size), Image.LANCZOS)
+                self._variants[max_size] = EncodedPage(resized)
+
+            return self._variants[max_size]
+
+
+def as_page(image) -> EncodedPage:
+    """Wrap a PIL image in an EncodedPage (no-op for pages)."""
+    if isinstance(image, EncodedPage):
+        return image
+
+    return EncodedPage(image)
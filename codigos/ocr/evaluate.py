@@ -0,0 +1,295 @@
+"""
+OCR engine evaluation harness.
+
+Runs every engine in ENGINES over a labeled set of documents (images/ by
+default) and appends one result per (engine, file, page) to the results store
+read by pages/experiment.py, with latency, cost and, when a ground truth is
+available, quality scores.
+
+A ground truth is a UTF-8 sidecar file next to the document: `sample.txt` for
+`sample.png`, or `doc.p1.txt`, `doc.p2.txt`, ... for the pages of `doc.pdf`.
+Struck-through text that must not be extracted is written ~~like this~~.
+
+    python evaluate.py images/ --engines anthropic_text_ocr mistral_ocr --repeat 3
+"""
+
+import os
+import re
+import sys
+import time
+import difflib
+import asyncio
+import argparse
+
+from batch import FILE_TYPES, find_documents
+from cache import CACHE
+from encoding import EncodedPage
+from functions import (
+    _aanthropic_text_ocr,
+    amistral_text_ocr,
+    atextract_text_ocr,
+    atiled_text_ocr,
+)
+from metrics import LOCAL_STAGES, collect, percentile, set_page
+from page_source import PageSource
+from results_store import ResultsStore
+from scoring import STRIKE_PATTERN, score_texts
+
+
+# Engine name -> async callable extracting the text of a page
+ENGINES = {
+    "anthropic_text_ocr": _aanthropic_text_ocr,
+    "anthropic_tiled_text_ocr": atiled_text_ocr,
+    "mistral_ocr": amistral_text_ocr,
+    "textract": atextract_text_ocr,
+}
+
+
+def ground_truth(path: str, page: int, page_count: int) -> str | None:
+    """Text of the sidecar ground truth file of a page, if there is one."""
+    stem = os.path.splitext(path)[0]
+    sidecar = f"{stem}.p{page + 1}.txt" if page_count > 1 else f"{stem}.txt"
+    if not os.path.exists(sidecar):
+        return None
+
+    with open(sidecar, encoding="utf-8") as f:
+        return f.read()
+
+
+def words(text: str) -> list[str]:
+    return re.findall(r"\S+", text or "")
+
+
+def evaluation_diff(extracted: str, reference: str) -> str:
+    """Word diff in the :red[mistake] :green[correction] markdown of the EVALUATION prompt."""
+    extracted, reference = words(extracted), words(reference)
+    matcher = difflib.SequenceMatcher(None, extracted, reference, autojunk=False)
+
+    parts = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            parts.append(" ".join(extracted[i1:i2]))
+            continue
+
+        if i2 > i1:
+            parts.append(f":red[{' '.join(extracted[i1:i2])}]")
+        if j2 > j1:
+            parts.append(f":green[{' '.join(reference[j1:j2])}]")
+
+    return " ".join(parts)
+
+
+def quality_fields(extracted: str, reference: str, score: dict) -> dict:
+    """Result store fields of a scored extraction."""
+    explanation = f"CER {score['cer']:.1%}, WER {score['wer']:.1%}"
+    if score["struck"]:
+        explanation += (
+            f", {score['struck_leaked']} of {score['struck']} struck-through phrases leaked"
+        )
+
+    exact = score["word_errors"] == 0 and score["struck_leaked"] == 0
+    return {
+        "similarity_score": score["similarity"],
+        "accuracy_score": 1.0 if exact else 0.0,
+        "cer": score["cer"],
+        "wer": score["wer"],
+        "struck_leaked": score["struck_leaked"],
+        "explanation": explanation,
+        "evaluation_diff": evaluation_diff(extracted, STRIKE_PATTERN.sub(" ", reference)),
+    }
+
+
+def provider_latency(records: list[dict]) -> float | None:
+    """
+    Time from the start of the first provider call to the end of the last one.
+
+    Provider stages run inside their limiter, so the time spent queueing for a
+    slot (which depends on --concurrency, not on the engine) is left out.
+    """
+    calls = [record for record in records if record["stage"] not in LOCAL_STAGES]
+    if not calls:
+        return None
+
+    start = min(record["timestamp"] - record["wall_time"] for record in calls)
+    return max(record["timestamp"] for record in calls) - start
+
+
+async def run_engine(engine: str, page: EncodedPage) -> dict:
+    """Extract a page with an engine, measuring its latency and cost."""
+    start = time.perf_counter()
+    with collect() as records:
+        try:
+            text = await ENGINES[engine](page)
+            error = None
+        except Exception as e:
+            text = ""
+            error = str(e)
+
+    # Without provider calls (cached responses) the whole call is the latency
+    latency = provider_latency(records)
+    return {
+        "extracted_text": text if isinstance(text, str) else str(text),
+        "latency": time.perf_counter() - start if latency is None else latency,
+        "cost": sum(record.get("cost", 0.0) for record in records),
+        "error": error,
+    }
+
+
+def load_pages(path: str, dpi: int) -> list[tuple[int, EncodedPage, bytes]]:
+    """(page index, page, PNG bytes) for every page of a document."""
+    with open(path, "rb") as f:
+        file_bytes = f.read()
+
+    source = PageSource(file_bytes, FILE_TYPES[os.path.splitext(path)[1].lower()], dpi)
+    pages = []
+    for index, image in source.iter_pages():
+        page = EncodedPage(image)
+        pages.append((index, page, page.to_bytes("PNG")))
+
+    return pages
+
+
+async def run(args) -> list[dict]:
+    documents = find_documents(args.inputs)
+    store = ResultsStore(args.output) if args.output else ResultsStore()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def evaluate(engine, path, index, page_count, page, png, reference):
+        async with semaphore:
+            set_page(index)
+            result = await run_engine(engine, page)
+
+        name = os.path.basename(path)
+        record = {
+            "file_name": name if page_count == 1 else f"{name}#p{index + 1}",
+            "model_name": engine,
+            "extracted_text": result["extracted_text"],
+            "cost": result["cost"],
+            "latency": result["latency"],
+            "image_data": png,
+        }
+        if result["error"]:
+            record["explanation"] = f"Error: {result['error']}"
+
+        return record, reference
+
+    tasks = []
+    for path in documents:
+        pages = await asyncio.to_thread(load_pages, path, args.dpi)
+        for index, page, png in pages:
+            reference = ground_truth(path, index, len(pages))
+            for engine in args.engines:
+                for _ in range(args.repeat):
+                    tasks.append(
+                        evaluate(engine, path, index, len(pages), page, png, reference)
+                    )
+
+    evaluated = await asyncio.gather(*tasks)
+
+    # Every successful run with a ground truth is scored in one batch (failed runs
+    # keep their "Error: ..." explanation)
+    labeled = [
+        (record, reference)
+        for record, reference in evaluated
+        if reference is not None and not failed(record)
+    ]
+    scores = await asyncio.to_thread(
+        score_texts,
+        [record["extracted_text"] for record, _ in labeled],
+        [reference for _, reference in labeled],
+    )
+    for (record, reference), score in zip(labeled, scores):
+        record.update(quality_fields(record["extracted_text"], reference, score))
+
+    results = [record for record, _ in evaluated]
+    await asyncio.to_thread(store.append, results)
+    return results
+
+
+def failed(result: dict) -> bool:
+    return result.get("explanation", "").startswith("Error:")
+
+
+def summarize(results: list[dict]) -> list[dict]:
+    """
+    Latency percentiles, cost and quality per engine. Failed runs are only
+    counted: a run that fails fast would make an engine look faster and cheaper.
+    """
+    by_engine = {}
+    for result in results:
+        by_engine.setdefault(result["model_name"], []).append(result)
+
+    rows = []
+    for engine, items in sorted(by_engine.items()):
+        ok = [item for item in items if not failed(item)]
+        latencies = [item["latency"] for item in ok]
+        scored = [item["similarity_score"] for item in ok if "similarity_score" in item]
+        cers = [item["cer"] for item in ok if "cer" in item]
+        rows.append(
+            {
+                "Engine": engine,
+                "Calls": len(items),
+                "Errors": len(items) - len(ok),
+                "P50 (s)": round(percentile(latencies, 0.50), 2) if ok else None,
+                "P95 (s)": round(percentile(latencies, 0.95), 2) if ok else None,
+                "P99 (s)": round(percentile(latencies, 0.99), 2) if ok else None,
+                "Mean Cost": round(sum(item["cost"] for item in ok) / len(ok), 5)
+                if ok
+                else None,
+                "Similarity": round(sum(scored) / len(scored), 3) if scored else None,
+                "CER": round(sum(cers) / len(cers), 3) if cers else None,
+            }
+        )
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate OCR engines on a labeled set")
+
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")],
+        help="Documents or directories to evaluate (default: images/)",
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=list(ENGINES),
+        default=list(ENGINES),
+        help="Engines to evaluate",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per engine and page")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Engine calls at the same time (provider limits still apply)",
+    )
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--output", help="Results store path (default: data/ocr_results.sqlite)")
+    parser.add_argument(
+        "--use-cache",
+        action="store_true",
+        help="Allow cached responses (latency and cost then measure the cache)",
+    )
+
+    args = parser.parse_args()
+    if not args.use_cache:
+        CACHE.enabled = False
+
+    results = asyncio.run(run(args))
+    rows = summarize(results)
+    if not rows:
+        print("No documents found", file=sys.stderr)
+        return
+
+    headers = list(rows[0])
+    print("\t".join(headers))
+    for row in rows:
+        print("\t".join(str(row[header]) for header in headers))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,221 @@
 import io
 import os
+import json
 import base64
 import math
-import uuid
-import boto3
+import hashlib
+import functools
 import typing
+import asyncio
+import itertools
+import contextvars
 
 import streamlit as st
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
 from PIL import Image
 from io import BytesIO
-from docx import Document
 
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
 from dotenv import load_dotenv
 
 from prompts import (
+    OCR_BATCH_CLASSIFICATION,
     OCR_CLASSIFICATION, 
     OCR_PROMPT, 
     OCR_TABLES
 )
 
-from repenseai.genai.agent import Agent
-from repenseai.genai.tasks.api import Task
-from pydantic import BaseModel
+from cache import CACHE
+from chunking import CHUNK_TOKENS, estimate_tokens, iter_text_chunks
+from page_source import MAX_PAGES, PageSource
+from encoding import PROVIDER_MAX_SIZE, EncodedPage, as_page
+from packing import (
+    PDF_PAGE_TOKENS,
+    Part,
+    base64_size,
+    build_content,
+    image_tokens,
+    pack,
+    png_part_size,
+    scaled_size,
+)
+from preclassify import preclassify
+from near_duplicates import PAGE_INDEX
+from tables import table_problems
+from tiling import TILING, needs_tiling, split_tiles, stitch_texts
+from clients import REGISTRY, mistral_client, textract_client
+
+from ratelimit import limiter, run_limited
+from resilience import ahedged, aretry, hedged, retry
+from metrics import set_page, stage, submit, token_usage
 
-from mistralai import Mistral
+from cassettes import Task
+from pydantic import BaseModel, ValidationError
 
 # Load environment variables from .env file
 load_dotenv()
 
-MISTRAL_CLIENT = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
+MISTRAL_CLIENT = mistral_client()
+
+# Maximum number of pages processed at the same time by process_document
+MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "4"))
+
+# Number of pages classified together in a single model request
+CLASSIFY_BATCH_SIZE = int(os.getenv("OCR_CLASSIFY_BATCH_SIZE", "4"))
+
+# Label blank and black pages locally before calling the classification model
+PRECLASSIFY = os.getenv("OCR_PRECLASSIFY", "true").lower() == "true"
+
+# Seconds to wait for Anthropic text extraction (about its p95) before also
+# sending the page to the fallback engine ("mistral", "textract" or "none")
+TEXT_OCR_BUDGET = float(os.getenv("OCR_TEXT_BUDGET_SECONDS", "45"))
+TEXT_OCR_FALLBACK = os.getenv("OCR_TEXT_FALLBACK", "mistral")
+
+# How a near-duplicate page match is verified before its result is reused:
+# "pixels" trusts the thumbnail check of the index, "text" also requires the
+# Mistral OCR text of both pages to be identical (up to whitespace), at the cost
+# of one Mistral OCR call per looked-up and per newly indexed page
+NEAR_DUPLICATE_VERIFY = os.getenv("OCR_NEAR_DUPLICATE_VERIFY", "text")
+
+# Extract tables with a fast model first (OCR_TABLE_TIERED) and only escalate to
+# the thinking model when the HTML table structure does not check out
+TABLE_TIERED = os.getenv("OCR_TABLE_TIERED", "true").lower() == "true"
+TABLE_FAST_MODEL = os.getenv("OCR_TABLE_FAST_MODEL", "claude-3-5-haiku-latest")
 
 class ClassificationResponse(BaseModel):
     classifications: list[str]
 
 
-def extract_docx_text(docx_bytes: bytes):
-    doc = Document(BytesIO(docx_bytes))
-    text = []
+class PageClassification(ClassificationResponse):
+    page: int
 
-    for paragraph in doc.paragraphs:
-        if paragraph.text.strip():
-            text.append(paragraph.text)
 
-    return "\n\n".join(text)
+class BatchClassificationResponse(BaseModel):
+    pages: list[PageClassification]
 
 
-def extract_txt_text(txt_bytes: bytes):
-    try:
-        text = txt_bytes.decode("utf-8")
-        return text
-    except UnicodeDecodeError:
-        return txt_bytes.decode("latin-1")
+class RequestError(Exception):
+    """Raised when a model request fails (repenseai logs the error and returns None)."""
 
 
-def textract_extract_text(image: bytes):
-    textract = boto3.client(
-        "textract",
-        region_name="us-east-2",
+class ClassificationError(Exception):
+    """Raised when a page could not be classified (unlike a "none" label, it is not blank)."""
+
+
+# Agent configurations, leased from the shared client registry
+AGENTS = {
+    "classify": dict(
+        model="gpt-4.1",
+        model_type="chat",
+        json_schema=ClassificationResponse,
+        price={"input": 2.0, "output": 8.0},
+    ),
+    "classify_batch": dict(
+        model="gpt-4.1",
+        model_type="chat",
+        json_schema=BatchClassificationResponse,
+        price={"input": 2.0, "output": 8.0},
+    ),
+    "text": dict(
+        model="claude-sonnet-4-0",
+        model_type="chat",
+        provider="anthropic",
+        price={"input": 3.0, "output": 15.0},
+        temperature=0.0,
+    ),
+    "document": dict(
+        model="gpt-4.1",
+        model_type="chat",
+        price={"input": 2.0, "output": 8.0},
+        temperature=0.0,
+    ),
+    "table_fast": dict(
+        model=TABLE_FAST_MODEL,
+        model_type="chat",
+        provider="anthropic",
+        price={"input": 0.8, "output": 4.0},
+        temperature=0.0,
+    ),
+    "table": dict(
+        model="claude-sonnet-4-0",
+        model_type="chat",
+        thinking=True,
+        provider="anthropic",
+        price={"input": 3.0, "output": 15.0},
+        temperature=0.0,
+    ),
+}
+
+
+def agent_price(name: str) -> dict:
+    return AGENTS[name].get("price")
+
+
+def upload_size(payload) -> int:
+    """Approximate size in bytes of a request payload (history or content list)."""
+    return len(json.dumps(payload, default=str))
+
+
+def agent_provider(name: str) -> str:
+    return AGENTS[name].get("provider", "openai")
+
+
+def agent_stage(name: str, stage_name: str, history: list, **fields):
+    """Metrics stage of a request to the agent `name`."""
+    return stage(
+        stage_name,
+        price=agent_price(name),
+        model=AGENTS[name]["model"],
+        bytes_uploaded=upload_size(history),
+        **fields,
+    )
+
+
+def run_agent(
+    name: str, prompt: str, history: list, stage_name: str, data: dict = None, **fields
+):
+    """Send `history` and `prompt` to a leased agent `name`, recording a metrics stage."""
+    with REGISTRY.agent(name, **AGENTS[name]) as agent:
+        task = Task(
+            user=prompt,
+            agent=agent,
+            simple_response=True,
+            history=history,
+        )
+
+        with agent_stage(name, stage_name, history, **fields) as record:
+            response = task.run(data or {})
+            record["input_tokens"], record["output_tokens"] = token_usage(agent)
+
+    if response is None:
+        raise RequestError(f"{stage_name} request to {AGENTS[name]['model']} failed")
+
+    return response
+
+
+async def arun_agent(
+    name: str, prompt: str, history: list, stage_name: str, data: dict = None, **fields
+):
+    """
+    Async version of run_agent, throttled by the limiter of the agent's provider.
+
+    repenseai's async chat API calls the sync Anthropic/OpenAI clients and would
+    block the event loop for the whole request, so run_agent runs in a thread.
+    """
+    return await run_limited(
+        agent_provider(name), run_agent, name, prompt, history, stage_name, data, **fields
     )
 
-    response = textract.detect_document_text(Document={"Bytes": image})
+
+@CACHE.cached(engine="textract", region="us-east-2")
+def textract_extract_text(image: bytes):
+    textract = textract_client("us-east-2")
+
+    with stage("textract", model="textract", pages=1, bytes_uploaded=len(image)):
+        response = textract.detect_document_text(Document={"Bytes": image})
+
     blocks = response["Blocks"]
     line_list = [block["Text"] for block in blocks if block["BlockType"] == "LINE"]
     return "\n".join(line_list)    
@@ -70,28 +224,20 @@ def textract_extract_text(image: bytes):
 def format_openai_file(file_bytes: bytes, file_type: str):
     if file_type == "pdf":
         images = convert_from_bytes(file_bytes)
-        image_data = []
-
-        for image in images:
-            buffered = BytesIO()
-            image.save(buffered, format="PNG")
-            image_data.append(
-                f"data:image/png;base64,{base64.b64encode(buffered.getvalue()).decode('utf-8')}"
-            )
+        image_data = [
+            EncodedPage(image).for_provider("openai").data_url() for image in images
+        ]
 
         return [{"type": "image_url", "image_url": {"url": img}} for img in image_data]
     elif file_type in ["png", "jpg", "jpeg"]:
-        image = Image.open(BytesIO(file_bytes))
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        image_data = f"data:image/png;base64,{base64.b64encode(buffered.getvalue()).decode('utf-8')}"
+        image = EncodedPage(Image.open(BytesIO(file_bytes)))
+        image_data = image.for_provider("openai").data_url()
 
         return [{"type": "image_url", "image_url": {"url": image_data}}]
     elif file_type in ["txt", "docx"]:
-        funcs = {"txt": extract_txt_text, "docx": extract_docx_text}
-        text = funcs[file_type](file_bytes)
+        chunks = iter_text_chunks(file_bytes, file_type)
 
-        return [{"type": "text", "text": text}]
+        return [{"type": "text", "text": chunk} for chunk in chunks]
     else:
         raise ValueError(f"Unsupported file type: {file_type}")
 
@@ -105,41 +251,195 @@ def format_openai_history(files: typing.List[bytes], types: typing.List[str]):
 
 def format_anthropic_file(file_bytes: bytes, file_type: str):
     if file_type == "pdf":
-        return {
-            "type": "document",
-            "source": {
-                "type": "base64",
-                "media_type": "application/pdf",
-                "data": base64.standard_b64encode(file_bytes).decode("utf-8"),
-            },
-        }
+        return [
+            {
+                "type": "document",
+                "source": {
+                    "type": "base64",
+                    "media_type": "application/pdf",
+                    "data": base64.standard_b64encode(file_bytes).decode("utf-8"),
+                },
+            }
+        ]
     elif file_type in ["txt", "docx"]:
-        funcs = {"txt": extract_txt_text, "docx": extract_docx_text}
-
-        text = funcs[file_type](file_bytes)
+        chunks = iter_text_chunks(file_bytes, file_type)
 
-        return {"type": "text", "text": text}
+        return [{"type": "text", "text": chunk} for chunk in chunks]
 
     else:
-        return {
-            "type": "image",
-            "source": {
-                "type": "base64",
-                "media_type": f"image/{file_type}",
-                "data": base64.standard_b64encode(file_bytes).decode("utf-8"),
-            },
-        }
+        return [
+            {
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": f"image/{file_type}",
+                    "data": base64.standard_b64encode(file_bytes).decode("utf-8"),
+                },
+            }
+        ]
 
 
 def format_anthropic_history(files: typing.List[bytes], types: typing.List[str]):
     history = {"role": "user", "content": []}
 
     for file, type in zip(files, types):
-        history["content"].append(format_anthropic_file(file, type))
+        history["content"].extend(format_anthropic_file(file, type))
 
     return [history]
 
 
+def pdf_page_size(info: dict, dpi: int = 200) -> tuple[int, int]:
+    """Pixel size of the pages of a PDF rasterized at `dpi`, from its pdfinfo."""
+    width, height = (float(value) for value in info["Page size"].split()[0:3:2])
+    return round(width * dpi / 72), round(height * dpi / 72)
+
+
+def text_content(text: str):
+    return [{"type": "text", "text": text}]
+
+
+def text_parts(file_bytes: bytes, file_type: str):
+    for chunk in iter_text_chunks(file_bytes, file_type):
+        yield Part(
+            len(chunk.encode("utf-8")),
+            estimate_tokens(chunk),
+            0,
+            functools.partial(text_content, chunk),
+        )
+
+
+def openai_pdf_page(file_bytes: bytes, index: int):
+    image = convert_from_bytes(file_bytes, first_page=index + 1, last_page=index + 1)[0]
+    url = EncodedPage(image).for_provider("openai").data_url()
+
+    return [{"type": "image_url", "image_url": {"url": url}}]
+
+
+def openai_file_parts(file_bytes: bytes, file_type: str):
+    """The content of format_openai_file as estimated parts: one per page or text chunk."""
+    max_size = PROVIDER_MAX_SIZE["openai"]
+
+    if file_type == "pdf":
+        info = pdfinfo_from_bytes(file_bytes)
+        size = scaled_size(pdf_page_size(info), max_size)
+
+        for index in range(info["Pages"]):
+            yield Part(
+                png_part_size(size),
+                image_tokens(size, "openai"),
+                1,
+                functools.partial(openai_pdf_page, file_bytes, index),
+            )
+    elif file_type in ["png", "jpg", "jpeg"]:
+        with Image.open(BytesIO(file_bytes)) as image:
+            size = scaled_size(image.size, max_size)
+
+        yield Part(
+            png_part_size(size),
+            image_tokens(size, "openai"),
+            1,
+            functools.partial(format_openai_file, file_bytes, file_type),
+        )
+    elif file_type in ["txt", "docx"]:
+        yield from text_parts(file_bytes, file_type)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def anthropic_file_parts(file_bytes: bytes, file_type: str):
+    """The content of format_anthropic_file as estimated parts (PDFs are sent whole)."""
+    build = functools.partial(format_anthropic_file, file_bytes, file_type)
+
+    if file_type == "pdf":
+        pages = pdfinfo_from_bytes(file_bytes)["Pages"]
+        yield Part(base64_size(len(file_bytes)), pages * PDF_PAGE_TOKENS, pages, build)
+    elif file_type in ["txt", "docx"]:
+        yield from text_parts(file_bytes, file_type)
+    else:
+        with Image.open(BytesIO(file_bytes)) as image:
+            size = scaled_size(image.size, PROVIDER_MAX_SIZE["anthropic"])
+
+        yield Part(base64_size(len(file_bytes)), image_tokens(size, "anthropic"), 1, build)
+
+
+FILE_PARTS = {
+    "openai": openai_file_parts,
+    "anthropic": anthropic_file_parts,
+}
+
+
+def format_histories(files: typing.List[bytes], types: typing.List[str], provider: str):
+    """
+    Like format_openai_history / format_anthropic_history, split into as few
+    requests as fit the provider limits.
+
+    Sizes and tokens are estimated before encoding, and each history is only
+    encoded when the iterator reaches it.
+    """
+    parts = itertools.chain.from_iterable(
+        FILE_PARTS[provider](file, file_type) for file, file_type in zip(files, types)
+    )
+
+    for request in pack(parts, provider):
+        yield [{"role": "user", "content": build_content(request)}]
+
+
+# Agent answering the packed requests of each provider
+HISTORY_AGENTS = {
+    "openai": "document",
+    "anthropic": "text",
+}
+
+
+def run_history(history: list, prompt: str, provider: str):
+    return run_agent(HISTORY_AGENTS[provider], prompt, history, f"{provider}_files")
+
+
+def process_files(
+    files: typing.List[bytes],
+    types: typing.List[str],
+    prompt: str,
+    provider: str = "anthropic",
+    max_workers: int = MAX_WORKERS,
+) -> list:
+    """
+    Run `prompt` over files packed into as few requests as fit the provider limits.
+
+    Requests are sent concurrently, at most `max_workers` encoded at a time,
+    and their answers are returned in file order.
+    """
+    answers = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for index, history in enumerate(format_histories(files, types, provider)):
+            if len(pending) >= max_workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    answers[pending.pop(future)] = future.result()
+
+            pending[submit(executor, retry, run_history, history, prompt, provider)] = index
+
+        for future in as_completed(pending):
+            answers[pending[future]] = future.result()
+
+    return [answers[index] for index in range(len(answers))]
+
+
+def format_anthropic_page(page: EncodedPage):
+    """Build an Anthropic history with a single page, reusing its memoized encoding."""
+    page = page.for_provider("anthropic")
+    content = {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": "image/png",
+            "data": page.to_base64("PNG"),
+        },
+    }
+
+    return [{"role": "user", "content": [content]}]
+
+
 def image_to_bytes(image: Image.Image) -> bytes:
     """Convert PIL Image to bytes."""
     img_byte_arr = io.BytesIO()
@@ -147,14 +447,6 @@ def image_to_bytes(image: Image.Image) -> bytes:
     return img_byte_arr.getvalue()
 
 
-def image_to_base64(image: Image.Image) -> str:
-    """Convert PIL Image to base64 string."""
-    img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format="PNG")
-    output = base64.b64encode(img_byte_arr.getvalue()).decode("utf-8")
-    return output
-
-
 def base64_to_image(base64_string: str) -> Image.Image:
     """Convert base64 string to PIL Image."""
     if base64_string.startswith("data:image"):
@@ -165,150 +457,928 @@ def base64_to_image(base64_string: str) -> Image.Image:
     return image
 
 
-def classify_image(image: Image.Image) -> list[str]:
-    """Classify the content type of an image."""
-    agent = Agent(
-        model="gpt-4.1",
-        model_type="vision",
-        json_schema=ClassificationResponse,
+def format_classification_pages(pages: list[EncodedPage]):
+    """Build an OpenAI chat history with the pages to classify."""
+    content = [
+        {
+            "type": "image_url",
+            "image_url": {"url": page.for_provider("openai").data_url()},
+        }
+        for page in pages
+    ]
+
+    return [{"role": "user", "content": content}]
+
+
+def classification_labels(response) -> list[str]:
+    """Labels of a single-page classification response."""
+    try:
+        return ClassificationResponse.model_validate(response).classifications
+    except ValidationError as e:
+        raise ClassificationError(
+            f"Invalid classification response: {str(response)[:100]!r}"
+        ) from e
+
+
+@CACHE.cached(model="gpt-4.1", prompt=OCR_CLASSIFICATION)
+def _classify_image(image: Image.Image | EncodedPage) -> list[str]:
+    history = format_classification_pages([as_page(image)])
+    return classification_labels(
+        run_agent("classify", OCR_CLASSIFICATION, history, "classify")
     )
 
-    task = Task(
-        user=OCR_CLASSIFICATION,
-        agent=agent,
-        simple_response=True,
+
+def local_classification(image: Image.Image | EncodedPage) -> list[str] | None:
+    """Labels from the local pre-classifier, or None when the model is needed."""
+    if not PRECLASSIFY:
+        return None
+
+    return preclassify(as_page(image).image)
+
+
+def classify_image(image: Image.Image | EncodedPage) -> list[str]:
+    """
+    Classify the content type of an image.
+
+    A failed classification raises (ClassificationError when the model answer is
+    unusable) rather than labelling the page "none", which would skip it as blank.
+    """
+    labels = local_classification(image)
+    if labels is not None:
+        return labels
+
+    return _classify_image(image)
+
+
+def batch_classifications(response, page_count: int) -> list[list[str] | None]:
+    """Labels of each page of a batch classification response (None if it left a page out)."""
+    parsed = BatchClassificationResponse.model_validate(response)
+    by_page = {item.page: item.classifications for item in parsed.pages}
+
+    return [by_page.get(i) for i in range(1, page_count + 1)]
+
+
+def _classify_batch(pages: list[EncodedPage]) -> list[list[str] | None]:
+    response = run_agent(
+        "classify_batch",
+        OCR_BATCH_CLASSIFICATION,
+        format_classification_pages(pages),
+        "classify_batch",
+        {"page_count": len(pages)},
+        batch_size=len(pages),
     )
 
-    try:
-        response = task.run({"image": image})
-        return response["classifications"]
-    except Exception:
-        return ["none"]
+    return batch_classifications(response, len(pages))
+
+
+def known_classifications(pages: list[EncodedPage]) -> tuple[list, list[int]]:
+    """
+    Labels known without a model request (pre-classifier or cache, None
+    otherwise) and the indexes of the pages that still need the model.
+    """
+    results = [local_classification(page) for page in pages]
+
+    pending = []
+    for idx, page in enumerate(pages):
+        if results[idx] is not None:
+            continue
+
+        cached = CACHE.get(_classify_image.cache_key(page))
+        if cached is not None:
+            results[idx] = cached
+        else:
+            pending.append(idx)
+
+    return results, pending
 
 
-def mistral_ocr(image: Image.Image, model="mistral-ocr-2503"):
+def store_batch_classifications(
+    pages: list[EncodedPage], results: list, pending: list[int], responses: list
+) -> list:
+    """Fill in (and cache) the labels a batch request returned for the pending pages."""
+    for idx, labels in zip(pending, responses):
+        if labels is not None:
+            results[idx] = labels
+            CACHE.set(_classify_image.cache_key(pages[idx]), labels)
+
+    return results
+
+
+def classify_images(images: list) -> list[list[str] | None]:
+    """
+    Classify several pages with a single model request.
+
+    Pages labelled by the local pre-classifier or already in the cache are not sent.
+    Pages left unclassified (a single pending page, pages the batch response leaves
+    out, or all of them if it fails) are returned as None: process_page classifies
+    them on their own in the page worker, where a failure becomes that page's error.
+    """
+    pages = [as_page(image) for image in images]
+    results, pending = known_classifications(pages)
+
+    if len(pending) > 1:
+        try:
+            responses = _classify_batch([pages[idx] for idx in pending])
+        except Exception:
+            responses = []
+
+        store_batch_classifications(pages, results, pending, responses)
+
+    return results
+
+
+def mistral_image_url(image: Image.Image | EncodedPage) -> str:
+    return as_page(image).for_provider("mistral").data_url("PNG")
+
+
+@CACHE.cached(engine="mistral", model="mistral-ocr-2503", include_image_base64=True)
+def mistral_ocr(image: Image.Image | EncodedPage, model="mistral-ocr-2503"):
     """Process image with Mistral OCR."""
-    image_b64 = image_to_base64(image)
-    ocr_response = MISTRAL_CLIENT.ocr.process(
-        model=model,
-        include_image_base64=True,
-        document={
-            "type": "image_url",
-            "image_url": f"data:image/png;base64,{image_b64}",
-        },
-    )
-    return ocr_response
+    image_url = mistral_image_url(image)
+
+    with stage("mistral_ocr", model=model, pages=1, bytes_uploaded=len(image_url)):
+        ocr_response = MISTRAL_CLIENT.ocr.process(
+            model=model,
+            include_image_base64=True,
+            document={
+                "type": "image_url",
+                "image_url": image_url,
+            },
+        )
 
+    return ocr_response
 
-def anthropic_text_ocr(image: Image.Image):
-    """Extract text from image using Anthropic."""
-    agent = Agent(
-        model="claude-sonnet-4-0",
-        model_type="chat",
-        provider="anthropic",
-        price={"input": 3.0, "output": 15.0},
-        temperature=0.0,
-    )
 
-    image_bytes = image_to_bytes(image)
-    history = format_anthropic_history([image_bytes], ["png"])
+@CACHE.cached(model="claude-sonnet-4-0", prompt=OCR_PROMPT, temperature=0.0)
+def _anthropic_text_ocr(image: Image.Image | EncodedPage):
+    history = format_anthropic_page(as_page(image))
+    return run_agent("text", OCR_PROMPT, history, "anthropic_text_ocr")
 
-    task = Task(
-        user=OCR_PROMPT,
-        agent=agent,
-        simple_response=True,
-        history=history,
-    )
 
+def anthropic_text_ocr(image: Image.Image | EncodedPage):
+    """Extract text from image using Anthropic."""
     try:
-        response = task.run({"image": image})
-        return response
+        return _anthropic_text_ocr(image)
     except Exception:
         return {"error": "Failed to process instructions"}
 
 
-def anthropic_table_ocr(image: Image.Image):
-    """Extract table from image using Anthropic."""
-    agent = Agent(
-        model="claude-sonnet-4-0",
-        model_type="chat",
-        thinking=True,
-        provider="anthropic",
-        price={"input": 3.0, "output": 15.0},
-        temperature=0.0,
-    )
+@CACHE.cached(
+    model="claude-sonnet-4-0", prompt=OCR_TABLES, temperature=0.0, thinking=True
+)
+def _anthropic_table_ocr(image: Image.Image | EncodedPage):
+    history = format_anthropic_page(as_page(image))
+    return run_agent("table", OCR_TABLES, history, "anthropic_table_ocr")["output"]
 
-    image_bytes = image_to_bytes(image)
-    history = format_anthropic_history([image_bytes], ["png"])
 
-    task = Task(
-        user=OCR_TABLES,
-        agent=agent,
-        simple_response=True,
-        history=history,
-    )
+@CACHE.cached(model=TABLE_FAST_MODEL, prompt=OCR_TABLES, temperature=0.0)
+def _anthropic_fast_table_ocr(image: Image.Image | EncodedPage):
+    history = format_anthropic_page(as_page(image))
+    return run_agent("table_fast", OCR_TABLES, history, "anthropic_fast_table_ocr")
+
+
+def fast_table_accepted(html) -> bool:
+    """Whether the fast model's table is good enough to skip the thinking model."""
+    return html is not None and not table_problems(html)
+
+
+def tiered_table_ocr(image: Image.Image | EncodedPage):
+    """
+    Extract tables with the fast model, escalating to the thinking model when
+    its HTML fails table_problems (or the fast call fails).
+    """
+    page = as_page(image)
 
+    if TABLE_TIERED:
+        try:
+            html = _anthropic_fast_table_ocr(page)
+        except Exception:
+            html = None
+
+        if fast_table_accepted(html):
+            return html
+
+    return _anthropic_table_ocr(page)
+
+
+def anthropic_table_ocr(image: Image.Image | EncodedPage):
+    """Extract table from image using Anthropic."""
     try:
-        response = task.run({"image": image})
-        return response["output"]
+        return tiered_table_ocr(image)
     except Exception:
         return {"error": "Failed to process instructions"}
 
 
-def process_single_page_data(image: Image.Image, classifications: list[str]):
-    """Process a single page based on its classifications."""
-    results = {
+def mistral_image_data(image: Image.Image | EncodedPage):
+    """Extract the embedded images of a page using Mistral OCR."""
+    mistral_results = mistral_ocr(image)
+    if mistral_results.pages:
+        return mistral_results.pages[0].images
+
+    return None
+
+
+def mistral_text_ocr(image: Image.Image | EncodedPage) -> str:
+    """Extract the page text as markdown using Mistral OCR."""
+    mistral_results = mistral_ocr(image)
+    return "\n\n".join(page.markdown for page in mistral_results.pages)
+
+
+def textract_text_ocr(image: Image.Image | EncodedPage) -> str:
+    """Extract the page text using AWS Textract."""
+    return textract_extract_text(as_page(image).to_bytes("PNG"))
+
+
+TEXT_FALLBACKS = {
+    "mistral": mistral_text_ocr,
+    "textract": textract_text_ocr,
+}
+
+
+def is_text(result) -> bool:
+    return isinstance(result, str) and bool(result.strip())
+
+
+def tiled_text_ocr(image: Image.Image | EncodedPage) -> str:
+    """
+    Extract the text of a large or multi-column page tile by tile, in parallel,
+    and stitch it back in reading order.
+    """
+    tiles = [EncodedPage(tile) for tile in split_tiles(as_page(image).image)]
+
+    with ThreadPoolExecutor(max_workers=len(tiles)) as executor:
+        futures = [submit(executor, retry, _anthropic_text_ocr, tile) for tile in tiles]
+        return stitch_texts([future.result() for future in futures])
+
+
+def anthropic_page_text_ocr(page: EncodedPage) -> str:
+    """Anthropic text extraction of a page, tiled when OCR_TILING is on and it needs it."""
+    if TILING and needs_tiling(page.image):
+        return tiled_text_ocr(page)
+
+    return retry(_anthropic_text_ocr, page)
+
+
+def text_ocr(image: Image.Image | EncodedPage) -> str:
+    """
+    Extract the page text with Anthropic, retrying failures with backoff.
+
+    If no answer arrives within TEXT_OCR_BUDGET seconds (or Anthropic keeps
+    failing), the page is also sent to the TEXT_OCR_FALLBACK engine and the first
+    good answer wins. Raises ExtractionError when every engine fails.
+    """
+    page = as_page(image)
+    calls = [lambda: anthropic_page_text_ocr(page)]
+
+    fallback = TEXT_FALLBACKS.get(TEXT_OCR_FALLBACK)
+    if fallback is not None:
+        calls.append(lambda: retry(fallback, page))
+
+    return hedged(calls, TEXT_OCR_BUDGET, accept=is_text)
+
+
+# Result field and extractor for each classification. Classifications sharing the
+# same extractor (text and instructions) are served by a single call.
+PAGE_EXTRACTORS = {
+    "text": ("text", text_ocr),
+    "instructions": ("instructions", text_ocr),
+    "table": ("table", tiered_table_ocr),
+    "image": ("image_data", mistral_image_data),
+}
+
+
+def empty_page_result() -> dict:
+    return {
         "text": None,
         "instructions": None,
         "table": None,
         "image_data": None,
     }
 
-    if "text" in classifications:
-        results["text"] = anthropic_text_ocr(image)
 
-    if "instructions" in classifications:
-        results["instructions"] = anthropic_text_ocr(image)
+def extractor_calls(classifications: list[str], extractors: dict) -> dict:
+    """Result fields filled by each extractor needed for these classifications."""
+    calls = {}
+    for classification in classifications:
+        if classification not in extractors:
+            continue
+
+        field, extractor = extractors[classification]
+        calls.setdefault(extractor, []).append(field)
+
+    return calls
+
 
-    if "table" in classifications:
-        results["table"] = anthropic_table_ocr(image)
+def page_result(calls: dict, outputs: list) -> dict:
+    """Page result from the output (or exception) of each call, in `calls` order."""
+    results = empty_page_result()
 
-    if "image" in classifications:
-        mistral_results = mistral_ocr(image)
-        if mistral_results.pages:
-            results["image_data"] = mistral_results.pages[0].images
+    errors = []
+    for fields, output in zip(calls.values(), outputs):
+        if isinstance(output, BaseException):
+            errors.append(f"{', '.join(fields)}: {output}")
+            continue
+
+        for field in fields:
+            results[field] = output
+
+    if errors:
+        results["error"] = "Failed to extract " + "; ".join(errors)
 
     return results
 
 
-def process_document(file_bytes: bytes, file_type: str) -> list[dict]:
+def process_single_page_data(image: Image.Image | EncodedPage, classifications: list[str]):
+    """Process a single page based on its classifications."""
+    calls = extractor_calls(classifications, PAGE_EXTRACTORS)
+    if not calls:
+        return page_result(calls, [])
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        futures = [submit(executor, extractor, image) for extractor in calls]
+        wait(futures)
+
+    return page_result(calls, [future.exception() or future.result() for future in futures])
+
+
+def process_page(
+    image: Image.Image | EncodedPage, classifications: list[str] = None
+) -> dict:
+    """Classify a single page (unless already classified) and extract its content."""
+    image = as_page(image)
+    if classifications is None:
+        classifications = classify_image(image)
+
+    if "none" in classifications:
+        return {}
+
+    return process_single_page_data(image, classifications)
+
+
+def native_text_pages(source: PageSource) -> dict[int, str]:
+    """Pages whose embedded PDF text layer can be used instead of OCR."""
+    native = {}
+    for idx in range(len(source)):
+        text = source.native_text(idx)
+        if text is not None:
+            native[idx] = text
+
+    return native
+
+
+def native_text_result(text: str) -> dict:
+    """Page result for text taken straight from the PDF text layer."""
+    return {**empty_page_result(), "text": text, "source": "text_layer"}
+
+
+def fingerprint_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def page_fingerprint(page: EncodedPage) -> str | None:
+    """Whitespace-normalized Mistral OCR text of a page, when matches are verified by text."""
+    if NEAR_DUPLICATE_VERIFY != "text":
+        return None
+
+    return fingerprint_text(mistral_text_ocr(page))
+
+
+def verified_match(matches: list[dict], fingerprint: str | None) -> dict | None:
+    """
+    First match whose text fingerprint equals `fingerprint` (any match when not
+    verifying by text). Near-identical text is not enough: a changed name, date
+    or amount is exactly what a reused result would get wrong.
+    """
+    for match in matches:
+        if fingerprint is None:
+            return match
+
+        if match["fingerprint"] == fingerprint:
+            return match
+
+    return None
+
+
+def reused_result(match: dict | None) -> dict | None:
+    if match is None:
+        return None
+
+    return {**match["result"], "source": "near_duplicate"}
+
+
+def indexable(result: dict) -> bool:
+    return PAGE_INDEX.enabled and not result.get("error")
+
+
+def near_duplicate_result(page: EncodedPage) -> dict | None:
+    """Result of an already extracted page that `page` nearly duplicates, if any."""
+    if not PAGE_INDEX.enabled:
+        return None
+
+    try:
+        matches = PAGE_INDEX.find(page.image)
+        match = verified_match(matches, page_fingerprint(page) if matches else None)
+    except Exception as e:
+        print(f"Near-duplicate lookup failed: {e}")
+        return None
+
+    return reused_result(match)
+
+
+def index_page(page: EncodedPage, result: dict) -> None:
+    """Add a successfully extracted page to the near-duplicate index."""
+    if not indexable(result):
+        return
+
+    try:
+        PAGE_INDEX.add(page.image, result, page_fingerprint(page))
+    except Exception as e:
+        print(f"Failed to index page: {e}")
+
+
+def process_and_index_page(page: EncodedPage, classifications: list[str]) -> dict:
+    result = process_page(page, classifications)
+    index_page(page, result)
+    return result
+
+
+def iter_process_document(
+    file_bytes: bytes,
+    file_type: str,
+    max_workers: int = MAX_WORKERS,
+    source: PageSource = None,
+    batch_size: int = CLASSIFY_BATCH_SIZE,
+) -> typing.Iterator[tuple[int, dict]]:
+    """
+    Processes an uploaded document page by page, yielding (page_index, result) as
+    soon as each page finishes (in completion order, not page order).
+
+    With OCR_TEXT_LAYER, born-digital PDF pages with a usable text layer are returned
+    right away without rasterization or model calls. The other pages are rasterized lazily from `source`
+    (built from the file when not given); those nearly identical to a page already
+    extracted reuse its result (see near_duplicates.py), the rest are classified
+    `batch_size` at a time in a single request and extracted concurrently by at most
+    `max_workers` threads, so only a few pages are held in memory at once. Pages the
+    batch request could not classify are classified on their own by their worker.
+    A page that fails (classification included) is yielded as {"error": ...}
+    instead of aborting the document.
+    """
+    if source is None:
+        source = PageSource(file_bytes, file_type)
+
+    if len(source) > MAX_PAGES:
+        raise ValueError(f"Document cannot exceed {MAX_PAGES} pages.")
+
+    native = native_text_pages(source)
+    for idx, text in native.items():
+        yield idx, native_text_result(text)
+
+    scanned = [idx for idx in range(len(source)) if idx not in native]
+
+    def collect(done):
+        for future in done:
+            idx = futures.pop(future)
+            try:
+                yield idx, future.result()
+            except Exception as e:
+                yield idx, {"error": f"Failed to process page {idx + 1}: {e}"}
+
+    max_workers = max(1, max_workers)
+    futures = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in itertools.batched(source.iter_pages(scanned), max(1, batch_size)):
+            batch = [(idx, as_page(image)) for idx, image in batch]
+
+            pending = []
+            for idx, page in batch:
+                result = near_duplicate_result(page)
+                if result is None:
+                    pending.append((idx, page))
+                else:
+                    yield idx, result
+
+            classifications = classify_images([page for _, page in pending])
+
+            for (idx, page), labels in zip(pending, classifications):
+                if len(futures) >= max_workers:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    yield from collect(done)
+
+                context = contextvars.copy_context()
+                context.run(set_page, idx)
+                futures[
+                    executor.submit(context.run, process_and_index_page, page, labels)
+                ] = idx
+
+        yield from collect(as_completed(list(futures)))
+
+
+def process_document(
+    file_bytes: bytes,
+    file_type: str,
+    max_workers: int = MAX_WORKERS,
+    source: PageSource = None,
+    batch_size: int = CLASSIFY_BATCH_SIZE,
+) -> list[dict]:
     """
     Processes an uploaded document (PDF or image) and returns extracted data for each page.
+
+    See iter_process_document. Results keep the page order and a page that fails is
+    recorded as {"error": ...}.
     """
-    if file_type == "application/pdf":
-        images = convert_from_bytes(file_bytes)
-    else:  # Assuming image type
-        images = [Image.open(io.BytesIO(file_bytes))]
+    if source is None:
+        source = PageSource(file_bytes, file_type)
+
+    processed_pages_data = [{} for _ in range(len(source))]
+
+    for idx, result in iter_process_document(
+        file_bytes, file_type, max_workers, source, batch_size
+    ):
+        processed_pages_data[idx] = result
+
+    return processed_pages_data
+
+
+def format_text_chunk(chunk: str):
+    return [{"role": "user", "content": [{"type": "text", "text": chunk}]}]
+
+
+@CACHE.cached(model=AGENTS["text"]["model"])
+def _anthropic_text_chunk(chunk: str, prompt: str) -> str:
+    return run_agent("text", prompt, format_text_chunk(chunk), "anthropic_text_chunk")
+
+
+def process_text_file(
+    file_bytes: bytes,
+    file_type: str,
+    prompt: str,
+    max_workers: int = MAX_WORKERS,
+    budget: int = CHUNK_TOKENS,
+) -> str:
+    """
+    Run `prompt` over a txt or docx file split into chunks of about `budget` tokens.
+
+    The file is read incrementally, chunks are sent concurrently and their
+    answers are joined in document order.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            submit(executor, retry, _anthropic_text_chunk, chunk, prompt)
+            for chunk in iter_text_chunks(file_bytes, file_type, budget)
+        ]
+
+        return "\n\n".join(future.result() for future in futures)
+
+
+# Async API. Each provider call goes through its own concurrency limit and token
+# bucket (see ratelimit.py), so many documents can share one event loop. Pages
+# are encoded into request histories in worker threads: encoding a full page
+# takes a few hundred milliseconds, which would otherwise stall every other page.
+
+
+@CACHE.shared_with(textract_extract_text)
+async def atextract_extract_text(image: bytes):
+    return await run_limited("textract", textract_extract_text.__wrapped__, image)
+
+
+@CACHE.shared_with(_classify_image)
+async def _aclassify_image(image: Image.Image | EncodedPage) -> list[str]:
+    history = await asyncio.to_thread(format_classification_pages, [as_page(image)])
+    return classification_labels(
+        await arun_agent("classify", OCR_CLASSIFICATION, history, "classify")
+    )
+
+
+async def aclassify_image(image: Image.Image | EncodedPage) -> list[str]:
+    """Async version of classify_image."""
+    labels = local_classification(image)
+    if labels is not None:
+        return labels
+
+    return await _aclassify_image(image)
+
+
+async def _aclassify_batch(pages: list[EncodedPage]) -> list[list[str] | None]:
+    history = await asyncio.to_thread(format_classification_pages, pages)
+    response = await arun_agent(
+        "classify_batch",
+        OCR_BATCH_CLASSIFICATION,
+        history,
+        "classify_batch",
+        {"page_count": len(pages)},
+        batch_size=len(pages),
+    )
+
+    return batch_classifications(response, len(pages))
+
 
-    if not images:
+async def aclassify_images(images: list) -> list[list[str] | None]:
+    """Async version of classify_images."""
+    pages = [as_page(image) for image in images]
+    results, pending = known_classifications(pages)
+
+    if len(pending) > 1:
+        try:
+            responses = await _aclassify_batch([pages[idx] for idx in pending])
+        except Exception:
+            responses = []
+
+        store_batch_classifications(pages, results, pending, responses)
+
+    return results
+
+
+@CACHE.shared_with(mistral_ocr)
+async def amistral_ocr(image: Image.Image | EncodedPage, model="mistral-ocr-2503"):
+    """Async version of mistral_ocr."""
+    image_url = await asyncio.to_thread(mistral_image_url, image)
+
+    async with limiter("mistral"):
+        with stage("mistral_ocr", model=model, pages=1, bytes_uploaded=len(image_url)):
+            return await MISTRAL_CLIENT.ocr.process_async(
+                model=model,
+                include_image_base64=True,
+                document={
+                    "type": "image_url",
+                    "image_url": image_url,
+                },
+            )
+
+
+@CACHE.shared_with(_anthropic_text_ocr)
+async def _aanthropic_text_ocr(image: Image.Image | EncodedPage):
+    history = await asyncio.to_thread(format_anthropic_page, as_page(image))
+    return await arun_agent("text", OCR_PROMPT, history, "anthropic_text_ocr")
+
+
+async def aanthropic_text_ocr(image: Image.Image | EncodedPage):
+    """Async version of anthropic_text_ocr."""
+    try:
+        return await _aanthropic_text_ocr(image)
+    except Exception:
+        return {"error": "Failed to process instructions"}
+
+
+@CACHE.shared_with(_anthropic_table_ocr)
+async def _aanthropic_table_ocr(image: Image.Image | EncodedPage):
+    history = await asyncio.to_thread(format_anthropic_page, as_page(image))
+    response = await arun_agent("table", OCR_TABLES, history, "anthropic_table_ocr")
+    return response["output"]
+
+
+@CACHE.shared_with(_anthropic_fast_table_ocr)
+async def _aanthropic_fast_table_ocr(image: Image.Image | EncodedPage):
+    history = await asyncio.to_thread(format_anthropic_page, as_page(image))
+    return await arun_agent(
+        "table_fast", OCR_TABLES, history, "anthropic_fast_table_ocr"
+    )
+
+
+async def atiered_table_ocr(image: Image.Image | EncodedPage):
+    """Async version of tiered_table_ocr."""
+    page = as_page(image)
+
+    if TABLE_TIERED:
+        try:
+            html = await _aanthropic_fast_table_ocr(page)
+        except Exception:
+            html = None
+
+        if fast_table_accepted(html):
+            return html
+
+    return await _aanthropic_table_ocr(page)
+
+
+async def aanthropic_table_ocr(image: Image.Image | EncodedPage):
+    """Async version of anthropic_table_ocr."""
+    try:
+        return await atiered_table_ocr(image)
+    except Exception:
+        return {"error": "Failed to process instructions"}
+
+
+async def amistral_image_data(image: Image.Image | EncodedPage):
+    """Async version of mistral_image_data."""
+    mistral_results = await amistral_ocr(image)
+    if mistral_results.pages:
+        return mistral_results.pages[0].images
+
+    return None
+
+
+async def amistral_text_ocr(image: Image.Image | EncodedPage) -> str:
+    """Async version of mistral_text_ocr."""
+    mistral_results = await amistral_ocr(image)
+    return "\n\n".join(page.markdown for page in mistral_results.pages)
+
+
+async def atextract_text_ocr(image: Image.Image | EncodedPage) -> str:
+    """Async version of textract_text_ocr."""
+    return await atextract_extract_text(as_page(image).to_bytes("PNG"))
+
+
+ASYNC_TEXT_FALLBACKS = {
+    "mistral": amistral_text_ocr,
+    "textract": atextract_text_ocr,
+}
+
+
+async def atiled_text_ocr(image: Image.Image | EncodedPage) -> str:
+    """Async version of tiled_text_ocr."""
+    tiles = await asyncio.to_thread(split_tiles, as_page(image).image)
+    texts = await asyncio.gather(
+        *(aretry(_aanthropic_text_ocr, EncodedPage(tile)) for tile in tiles)
+    )
+    return stitch_texts(texts)
+
+
+async def aanthropic_page_text_ocr(page: EncodedPage) -> str:
+    """Async version of anthropic_page_text_ocr."""
+    if TILING and await asyncio.to_thread(needs_tiling, page.image):
+        return await atiled_text_ocr(page)
+
+    return await aretry(_aanthropic_text_ocr, page)
+
+
+async def atext_ocr(image: Image.Image | EncodedPage) -> str:
+    """Async version of text_ocr. The losing engine is cancelled."""
+    page = as_page(image)
+    calls = [lambda: aanthropic_page_text_ocr(page)]
+
+    fallback = ASYNC_TEXT_FALLBACKS.get(TEXT_OCR_FALLBACK)
+    if fallback is not None:
+        calls.append(lambda: aretry(fallback, page))
+
+    return await ahedged(calls, TEXT_OCR_BUDGET, accept=is_text)
+
+
+ASYNC_PAGE_EXTRACTORS = {
+    "text": ("text", atext_ocr),
+    "instructions": ("instructions", atext_ocr),
+    "table": ("table", atiered_table_ocr),
+    "image": ("image_data", amistral_image_data),
+}
+
+
+async def aprocess_single_page_data(
+    image: Image.Image | EncodedPage, classifications: list[str]
+):
+    """Async version of process_single_page_data."""
+    calls = extractor_calls(classifications, ASYNC_PAGE_EXTRACTORS)
+    outputs = await asyncio.gather(
+        *(extractor(image) for extractor in calls), return_exceptions=True
+    )
+
+    return page_result(calls, outputs)
+
+
+async def aprocess_page(
+    image: Image.Image | EncodedPage, classifications: list[str] = None
+) -> dict:
+    """Async version of process_page."""
+    image = as_page(image)
+    if classifications is None:
+        classifications = await aclassify_image(image)
+
+    if "none" in classifications:
+        return {}
+
+    return await aprocess_single_page_data(image, classifications)
+
+
+async def apage_fingerprint(page: EncodedPage) -> str | None:
+    """Async version of page_fingerprint."""
+    if NEAR_DUPLICATE_VERIFY != "text":
+        return None
+
+    return fingerprint_text(await amistral_text_ocr(page))
+
+
+async def anear_duplicate_result(page: EncodedPage) -> dict | None:
+    """Async version of near_duplicate_result."""
+    if not PAGE_INDEX.enabled:
+        return None
+
+    try:
+        matches = await asyncio.to_thread(PAGE_INDEX.find, page.image)
+        match = verified_match(matches, await apage_fingerprint(page) if matches else None)
+    except Exception as e:
+        print(f"Near-duplicate lookup failed: {e}")
+        return None
+
+    return reused_result(match)
+
+
+async def aindex_page(page: EncodedPage, result: dict) -> None:
+    """Async version of index_page."""
+    if not indexable(result):
+        return
+
+    try:
+        fingerprint = await apage_fingerprint(page)
+        await asyncio.to_thread(PAGE_INDEX.add, page.image, result, fingerprint)
+    except Exception as e:
+        print(f"Failed to index page: {e}")
+
+
+async def aprocess_document(
+    file_bytes: bytes,
+    file_type: str,
+    max_workers: int = MAX_WORKERS,
+    source: PageSource = None,
+    batch_size: int = CLASSIFY_BATCH_SIZE,
+) -> list[dict]:
+    """
+    Async version of process_document.
+
+    Text layer extraction and rasterization run in worker threads and at most
+    `max_workers` pages of this document are in flight at once; provider calls are
+    throttled by the shared per-provider limiters.
+    """
+    if source is None:
+        source = await asyncio.to_thread(PageSource, file_bytes, file_type)
+
+    if len(source) == 0:
         return []
 
-    if len(images) > 10:
-        raise ValueError("Document cannot exceed 10 pages.")
+    if len(source) > MAX_PAGES:
+        raise ValueError(f"Document cannot exceed {MAX_PAGES} pages.")
 
-    processed_pages_data = []
-    for image in images:
-        classifications = classify_image(image)
-        if "none" in classifications:
-            processed_pages_data.append({})
-            continue
+    processed_pages_data = [{} for _ in range(len(source))]
+
+    native = await asyncio.to_thread(native_text_pages, source)
+    for idx, text in native.items():
+        processed_pages_data[idx] = native_text_result(text)
 
-        page_data = process_single_page_data(image, classifications)
-        processed_pages_data.append(page_data)
+    scanned = [idx for idx in range(len(source)) if idx not in native]
 
+    max_workers = max(1, max_workers)
+    batch_size = min(max(1, batch_size), max_workers)
+    in_flight = asyncio.Semaphore(max_workers)
+
+    async def run_page(idx, page, labels):
+        set_page(idx)
+        try:
+            processed_pages_data[idx] = await aprocess_page(page, labels)
+            await aindex_page(page, processed_pages_data[idx])
+        except Exception as e:
+            processed_pages_data[idx] = {
+                "error": f"Failed to process page {idx + 1}: {e}"
+            }
+        finally:
+            in_flight.release()
+
+    pages_iter = source.iter_pages(scanned)
+    tasks = []
+    remaining = len(scanned)
+
+    while remaining:
+        batch = []
+        while len(batch) < min(batch_size, remaining):
+            await in_flight.acquire()
+            idx, image = await asyncio.to_thread(next, pages_iter)
+            batch.append((idx, as_page(image)))
+
+        remaining -= len(batch)
+
+        pending = []
+        for idx, page in batch:
+            result = await anear_duplicate_result(page)
+            if result is None:
+                pending.append((idx, page))
+            else:
+                processed_pages_data[idx] = result
+                in_flight.release()
+
+        classifications = await aclassify_images([page for _, page in pending])
+
+        for (idx, page), labels in zip(pending, classifications):
+            tasks.append(asyncio.create_task(run_page(idx, page, labels)))
+
+    await asyncio.gather(*tasks)
     return processed_pages_data
 
 
+@CACHE.shared_with(_anthropic_text_chunk)
+async def _aanthropic_text_chunk(chunk: str, prompt: str) -> str:
+    return await arun_agent(
+        "text", prompt, format_text_chunk(chunk), "anthropic_text_chunk"
+    )
+
+
+async def aprocess_text_file(
+    file_bytes: bytes, file_type: str, prompt: str, budget: int = CHUNK_TOKENS
+) -> str:
+    """Async version of process_text_file. Concurrency is bounded by the Anthropic limiter."""
+    chunks = await asyncio.to_thread(list, iter_text_chunks(file_bytes, file_type, budget))
+    answers = await asyncio.gather(
+        *(aretry(_aanthropic_text_chunk, chunk, prompt) for chunk in chunks)
+    )
+    return "\n\n".join(answers)
+
+
 def resize_image_for_display(image: Image.Image) -> Image.Image:
     """
     Resize and process image according to publication specifications.
@@ -337,36 +1407,71 @@ def resize_image_for_display(image: Image.Image) -> Image.Image:
     return image
 
 
+# Width of the thumbnails shown in the extracted images grid
+THUMBNAIL_WIDTH = 400
+
+
+def image_digest(image_base64: str) -> str:
+    return hashlib.sha1(image_base64.encode("utf-8")).hexdigest()[:16]
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def image_thumbnail(digest: str, _image_base64: str) -> bytes:
+    """Small JPEG thumbnail of an extracted image, cached by content digest."""
+    image = base64_to_image(_image_base64).convert("RGB")
+    image.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4))
+
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=85)
+    return buffered.getvalue()
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def image_print_derivative(digest: str, _image_base64: str) -> bytes:
+    """Full-resolution print PNG of an extracted image, cached by content digest."""
+    return image_to_bytes(resize_image_for_display(base64_to_image(_image_base64)))
+
+
 def display_images(images_data):
-    """Display images in a grid layout with download buttons."""
+    """
+    Display images in a grid of cached thumbnails.
+
+    The full-resolution print version of an image is only generated when its
+    download is requested.
+    """
     cols = st.columns(4)
     for idx, ocr_img_data in enumerate(images_data):
         try:
-            image_bytes_pil = base64_to_image(ocr_img_data.image_base64)
+            image_base64 = ocr_img_data.image_base64
+            digest = image_digest(image_base64)
+            thumbnail = image_thumbnail(digest, image_base64)
         except AttributeError:
             st.error(
                 "Image data format from service is not as expected for display_images."
             )
             continue
 
-        image_id = str(uuid.uuid4())
+        prepare_key = f"prepare_download_{digest}"
 
         with cols[idx % 4]:
-            st.image(image_bytes_pil, caption=f"Imagem {idx + 1}")
-            resized_pil_image = resize_image_for_display(image_bytes_pil)
+            st.image(thumbnail, caption=f"Imagem {idx + 1}")
+
+            if not st.session_state.get(prepare_key):
+                if not st.button("Prepare download", key=f"prepare_{digest}_{idx}"):
+                    continue
 
-            download_image_bytes = image_to_bytes(resized_pil_image)
+                st.session_state[prepare_key] = True
 
             st.download_button(
                 label="Download",
-                data=download_image_bytes,
-                file_name=f"{image_id}.png",
+                data=image_print_derivative(digest, image_base64),
+                file_name=f"{digest}.png",
                 mime="image/png",
-                key=f"download_{image_id}_{idx}",
+                key=f"download_{digest}_{idx}",
             )
 
 
-def display_results(results: dict, page_index: int = None, pages_images: list = None):
+def display_results(results: dict, page_index: int = None, pages_images=None):
     """Display OCR results with optional page image."""
     # Get the current page image if page_index is provided
     current_page_image = None
@@ -374,6 +1479,9 @@ def display_results(results: dict, page_index: int = None, pages_images: list =
         if 0 <= page_index < len(pages_images):
             current_page_image = pages_images[page_index]
 
+    if results.get("error"):
+        st.error(results["error"])
+
     # Check if we have any text content (either text or instructions)
     text_content = results.get("text") or results.get("instructions")
 
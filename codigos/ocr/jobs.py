@@ -0,0 +1,140 @@
+import os
+import time
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+from functions import iter_process_document
+from metrics import collect, summarize
+from page_source import MAX_PAGES, PageSource
+
+
+class DocumentJob:
+    """
+    Runs iter_process_document in a background thread so the Streamlit app can
+    show each page as soon as it finishes.
+
+    The thread only writes plain attributes; the app polls them on every rerun.
+    """
+
+    def __init__(self, file_bytes: bytes, file_type: str, name: str, source: PageSource):
+        self.file_bytes = file_bytes
+        self.file_type = file_type
+        self.name = name
+        self.source = source
+
+        self.results: list[dict | None] = [None] * len(source)
+        self.metrics_summary: list[dict] = []
+        self.error: str | None = None
+        self.done = False
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "DocumentJob":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        try:
+            with collect(document=self.name) as records:
+                for idx, result in iter_process_document(
+                    self.file_bytes, self.file_type, source=self.source
+                ):
+                    self.results[idx] = result
+
+            self.metrics_summary = summarize(records)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error during OCR processing: {e}")
+        finally:
+            self.file_bytes = None
+            self.done = True
+
+    @property
+    def failed(self) -> bool:
+        """Whether the job, or any of its pages, failed."""
+        return self.error is not None or any(
+            result and result.get("error") for result in self.results
+        )
+
+    @property
+    def completed(self) -> int:
+        return sum(result is not None for result in self.results)
+
+    def page_status(self, idx: int) -> str:
+        result = self.results[idx]
+        if result is None:
+            return "⏳ Processing" if not self.done else "❌ Not processed"
+        if result.get("error"):
+            return "⚠️ Error"
+        if not result:
+            return "➖ No content"
+
+        return "✅ Done"
+
+
+class JobCache:
+    """
+    Bounded LRU of DocumentJobs keyed by file content hash.
+
+    It lives at module level, so it survives Streamlit reruns and is shared by
+    every session of the server: re-uploading a file, or clicking "Process
+    Document" again, returns the existing job (and its rendered previews)
+    instead of processing the file again. Failed jobs are never reused.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> DocumentJob | None:
+        with self._lock:
+            entry = self._jobs.get(digest)
+            if entry is None:
+                return None
+
+            created, job = entry
+            if job.failed or time.time() - created > self.ttl:
+                del self._jobs[digest]
+                return None
+
+            self._jobs.move_to_end(digest)
+            return job
+
+    def put(self, digest: str, job: DocumentJob) -> None:
+        with self._lock:
+            self._jobs[digest] = (time.time(), job)
+            self._jobs.move_to_end(digest)
+
+            while len(self._jobs) > self.max_entries:
+                self._jobs.popitem(last=False)
+
+
+JOBS = JobCache(
+    max_entries=int(os.getenv("OCR_UI_CACHE_ENTRIES", "16")),
+    ttl=float(os.getenv("OCR_UI_CACHE_TTL_SECONDS", "3600")),
+)
+
+
+def get_or_start_job(file_bytes: bytes, file_type: str, name: str) -> DocumentJob:
+    """
+    Return the cached job for this file content, or start a new one.
+
+    Raises ValueError if the document has more than MAX_PAGES pages.
+    """
+    digest = hashlib.sha256(file_bytes).hexdigest()
+
+    job = JOBS.get(digest)
+    if job is not None:
+        return job
+
+    source = PageSource(file_bytes, file_type)
+    if len(source) > MAX_PAGES:
+        raise ValueError(f"Please upload a document up to {MAX_PAGES} pages.")
+
+    job = DocumentJob(file_bytes, file_type, name, source).start()
+    JOBS.put(digest, job)
+    return job
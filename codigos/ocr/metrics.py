@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import threading
+import contextvars
+
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+METRICS_PATH = os.getenv(
+    "OCR_METRICS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "metrics.jsonl"),
+)
+METRICS_ENABLED = os.getenv("OCR_METRICS_ENABLED", "true").lower() == "true"
+
+# Engines billed per page rather than per token (USD per page)
+PAGE_PRICES = {
+    "mistral-ocr-2503": 0.001,
+    "textract": 0.0015,
+}
+
+# Stages that run locally; every other stage is a provider call
+LOCAL_STAGES = {"rasterize", "encode"}
+
+_document = contextvars.ContextVar("metrics_document", default=None)
+_page = contextvars.ContextVar("metrics_page", default=None)
+_collector = contextvars.ContextVar("metrics_collector", default=None)
+
+_write_lock = threading.Lock()
+
+
+@contextmanager
+def collect(document: str = None):
+    """Collect the stage records emitted inside the block into the yielded list."""
+    records = []
+    collector_token = _collector.set(records)
+    document_token = _document.set(document)
+
+    try:
+        yield records
+    finally:
+        _collector.reset(collector_token)
+        _document.reset(document_token)
+
+
+def set_document(document: str) -> None:
+    """Tag the records emitted in the current context with a document name."""
+    _document.set(document)
+
+
+def set_page(page: int) -> None:
+    """Tag the records emitted in the current context with a page number (0-based)."""
+    _page.set(page)
+
+
+def submit(executor, func, *args):
+    """executor.submit that carries the current metrics context into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+
+def token_usage(agent) -> tuple[int, int]:
+    """Input and output tokens of the last run of a repenseai agent (0 if unknown)."""
+    tokens = getattr(agent, "tokens", None) or getattr(
+        getattr(agent, "api", None), "tokens", None
+    )
+
+    if not isinstance(tokens, dict):
+        return 0, 0
+
+    input_tokens = tokens.get("input_tokens", tokens.get("prompt_tokens", 0))
+    output_tokens = tokens.get("output_tokens", tokens.get("completion_tokens", 0))
+    return int(input_tokens or 0), int(output_tokens or 0)
+
+
+def compute_cost(record: dict, price: dict = None) -> float:
+    """Cost in USD of a stage, from a per-million-token price table or PAGE_PRICES."""
+    if price:
+        return (
+            record.get("input_tokens", 0) * price.get("input", 0.0)
+            + record.get("output_tokens", 0) * price.get("output", 0.0)
+        ) / 1_000_000
+
+    return PAGE_PRICES.get(record.get("model"), 0.0) * record.get("pages", 0)
+
+
+@contextmanager
+def stage(name: str, price: dict = None, **fields):
+    """
+    Time a pipeline stage and emit its record when the block exits.
+
+    The yielded dict can be filled with model, bytes_uploaded, input_tokens,
+    output_tokens and pages; the cost is computed from `price` (per million
+    tokens) or PAGE_PRICES.
+    """
+    record = {
+        "stage": name,
+        "document": _document.get(),
+        "page": _page.get(),
+        "bytes_uploaded": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        **fields,
+    }
+
+    start = time.perf_counter()
+    try:
+        yield record
+        record["status"] = "ok"
+    except BaseException as e:
+        record["status"] = "error"
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["wall_time"] = time.perf_counter() - start
+        record["cost"] = compute_cost(record, price)
+        record["timestamp"] = time.time()
+        emit(record)
+
+
+def emit(record: dict) -> None:
+    """Send a record to the active collector and append it to the JSONL sink."""
+    records = _collector.get()
+    if records is not None:
+        records.append(record)
+
+    if not METRICS_ENABLED:
+        return
+
+    line = json.dumps(record, default=str)
+    with _write_lock:
+        os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+        with open(METRICS_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(records: list[dict]) -> list[dict]:
+    """Aggregate stage records into one row per stage, most expensive in time first."""
+    by_stage = {}
+    for record in records:
+        by_stage.setdefault(record["stage"], []).append(record)
+
+    rows = []
+    for name, items in by_stage.items():
+        times = [item["wall_time"] for item in items]
+        rows.append(
+            {
+                "Stage": name,
+                "Calls": len(items),
+                "Errors": sum(item.get("status") == "error" for item in items),
+                "Total Time (s)": round(sum(times), 3),
+                "Mean Time (s)": round(sum(times) / len(times), 3),
+                "P95 Time (s)": round(percentile(times, 0.95), 3),
+                "Bytes Uploaded": sum(item.get("bytes_uploaded", 0) for item in items),
+                "Input Tokens": sum(item.get("input_tokens", 0) for item in items),
+                "Output Tokens": sum(item.get("output_tokens", 0) for item in items),
+                "Cost": round(sum(item.get("cost", 0.0) for item in items), 5),
+            }
+        )
+
+    return sorted(rows, key=lambda row: row["Total Time (s)"], reverse=True)
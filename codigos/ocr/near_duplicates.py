@@ -0,0 +1,207 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+
+import numpy as np
+
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INDEX_PATH = os.getenv(
+    "OCR_NEAR_DUPLICATE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "page_index.sqlite"),
+)
+
+# Reuse the results of pages that look like an already extracted page
+NEAR_DUPLICATES = os.getenv("OCR_NEAR_DUPLICATES", "false").lower() == "true"
+
+# Largest Hamming distance, out of HASH_BITS, between two near-duplicate pages
+MAX_DISTANCE = int(os.getenv("OCR_NEAR_DUPLICATE_DISTANCE", "16"))
+
+# dHash grid side: HASH_SIZE x HASH_SIZE gradient bits
+HASH_SIZE = 16
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+# Grayscale thumbnail used to verify a hash match pixel by pixel
+THUMBNAIL_SIZE = (96, 128)
+
+# Largest mean absolute difference (0-255) between the thumbnails of a match
+MAX_THUMBNAIL_DIFFERENCE = 6.0
+
+# Largest relative difference between the aspect ratios of a match
+MAX_ASPECT_DIFFERENCE = 0.02
+
+
+def dhash(image: Image.Image) -> bytes:
+    """Difference hash (HASH_BITS bits) of a small grayscale copy of the image."""
+    small = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    return np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes()
+
+
+def thumbnail(image: Image.Image) -> bytes:
+    return image.convert("L").resize(THUMBNAIL_SIZE, Image.BILINEAR).tobytes()
+
+
+def thumbnail_difference(first: bytes, second: bytes) -> float:
+    first = np.frombuffer(first, dtype=np.uint8).astype(np.int16)
+    second = np.frombuffer(second, dtype=np.uint8).astype(np.int16)
+    return float(np.abs(first - second).mean())
+
+
+class PageIndex:
+    """
+    Disk-backed index of extracted pages, searched by perceptual hash.
+
+    The hashes are kept in memory as a packed bit matrix, so a lookup is one
+    vectorized Hamming distance computation over every entry. A hash match is
+    confirmed on a small grayscale thumbnail before its result is reused.
+    """
+
+    def __init__(
+        self,
+        path: str = INDEX_PATH,
+        max_distance: int = MAX_DISTANCE,
+        max_entries: int = 50_000,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self._ids = None
+        self._hashes = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    id INTEGER PRIMARY KEY,
+                    hash BLOB NOT NULL,
+                    aspect REAL NOT NULL,
+                    thumbnail BLOB NOT NULL,
+                    fingerprint TEXT,
+                    result BLOB NOT NULL,
+                    created REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+
+        return self._conn
+
+    def _load(self) -> None:
+        if self._hashes is not None:
+            return
+
+        rows = self.conn.execute("SELECT id, hash FROM pages ORDER BY id").fetchall()
+        self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._hashes = np.frombuffer(
+            b"".join(row[1] for row in rows), dtype=np.uint8
+        ).reshape(len(rows), HASH_BITS // 8)
+
+    def find(self, image: Image.Image) -> list[dict]:
+        """
+        Entries matching `image`, closest first, as dicts with the stored result,
+        its fingerprint (if any) and the Hamming distance.
+        """
+        if not self.enabled:
+            return []
+
+        query = np.frombuffer(dhash(image), dtype=np.uint8)
+        aspect = image.width / image.height
+        pixels = thumbnail(image)
+
+        with self._lock:
+            self._load()
+            if not len(self._ids):
+                return []
+
+            distances = np.unpackbits(self._hashes ^ query, axis=1).sum(axis=1)
+            close = np.flatnonzero(distances <= self.max_distance)
+            close = close[np.argsort(distances[close], kind="stable")]
+
+            matches = []
+            for position in close:
+                row = self.conn.execute(
+                    "SELECT aspect, thumbnail, fingerprint, result FROM pages WHERE id = ?",
+                    (int(self._ids[position]),),
+                ).fetchone()
+
+                if row is None:
+                    continue
+                if abs(row[0] - aspect) / aspect > MAX_ASPECT_DIFFERENCE:
+                    continue
+                if thumbnail_difference(row[1], pixels) > MAX_THUMBNAIL_DIFFERENCE:
+                    continue
+
+                matches.append(
+                    {
+                        "result": pickle.loads(row[3]),
+                        "fingerprint": row[2],
+                        "distance": int(distances[position]),
+                    }
+                )
+
+        return matches
+
+    def add(self, image: Image.Image, result: dict, fingerprint: str = None) -> None:
+        """Index the extraction result of a page (with an optional text fingerprint)."""
+        if not self.enabled:
+            return
+
+        page_hash = dhash(image)
+        values = (
+            page_hash,
+            image.width / image.height,
+            thumbnail(image),
+            fingerprint,
+            pickle.dumps(result),
+            time.time(),
+        )
+
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO pages (hash, aspect, thumbnail, fingerprint, result, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                values,
+            )
+
+            count = self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM pages WHERE id IN "
+                    "(SELECT id FROM pages ORDER BY id LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                self._hashes = None
+            elif self._hashes is not None:
+                self._ids = np.append(self._ids, cursor.lastrowid)
+                self._hashes = np.vstack(
+                    [self._hashes, np.frombuffer(page_hash, dtype=np.uint8)]
+                )
+
+            self.conn.commit()
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self.conn.execute("DELETE FROM pages")
+            self.conn.commit()
+            self._hashes = None
+
+
+PAGE_INDEX = PageIndex(enabled=NEAR_DUPLICATES)
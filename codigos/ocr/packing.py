@@ -0,0 +1,98 @@
+import math
+
+from typing import Callable, Iterator, NamedTuple
+
+
+# Per-request limits, with some headroom below what the APIs accept
+REQUEST_LIMITS = {
+    "openai": {"bytes": 45 * 1024 * 1024, "images": 500, "tokens": 800_000},
+    "anthropic": {"bytes": 30 * 1024 * 1024, "images": 100, "tokens": 150_000},
+}
+
+# Rough PNG size of a rasterized page, used before the page is rendered
+PNG_BYTES_PER_PIXEL = 1.0
+
+# Anthropic bills each PDF page as text plus a page image
+PDF_PAGE_TOKENS = 3000
+
+
+class Part(NamedTuple):
+    """
+    A piece of a request, estimated before it is encoded.
+
+    `build` returns its content blocks; it is only called when the request that
+    holds the part is about to be sent.
+    """
+
+    bytes: int
+    tokens: int
+    images: int
+    build: Callable[[], list[dict]]
+
+
+def base64_size(size: int) -> int:
+    return 4 * math.ceil(size / 3)
+
+
+def scaled_size(size: tuple[int, int], max_size: int | None) -> tuple[int, int]:
+    """Image size after downscaling its longest side to `max_size`."""
+    width, height = size
+    if max_size is None or max(width, height) <= max_size:
+        return width, height
+
+    ratio = max_size / max(width, height)
+    return round(width * ratio), round(height * ratio)
+
+
+def image_tokens(size: tuple[int, int], provider: str) -> int:
+    """Input tokens of an image as billed by the provider."""
+    width, height = size
+
+    if provider == "anthropic":
+        return math.ceil(width * height / 750)
+
+    # OpenAI high detail: fit in 2048x2048, shortest side to 768, 512px tiles
+    width, height = scaled_size((width, height), 2048)
+    ratio = min(1.0, 768 / min(width, height))
+    tiles = math.ceil(width * ratio / 512) * math.ceil(height * ratio / 512)
+    return 85 + 170 * tiles
+
+
+def png_part_size(size: tuple[int, int]) -> int:
+    """Estimated base64 size of an image re-encoded as PNG."""
+    return base64_size(int(size[0] * size[1] * PNG_BYTES_PER_PIXEL))
+
+
+def pack(parts, provider: str) -> Iterator[list[Part]]:
+    """
+    Group parts, in order, into as few requests as fit the provider limits.
+
+    A part that exceeds the limits by itself is sent alone.
+    """
+    limits = REQUEST_LIMITS[provider]
+    request = []
+    used = {"bytes": 0, "tokens": 0, "images": 0}
+
+    for part in parts:
+        if request and any(
+            used[name] + getattr(part, name) > limit for name, limit in limits.items()
+        ):
+            yield request
+            request = []
+            used = {"bytes": 0, "tokens": 0, "images": 0}
+
+        request.append(part)
+        for name in used:
+            used[name] += getattr(part, name)
+
+    if request:
+        yield request
+
+
+def build_content(request: list[Part]) -> list[dict]:
+    """Encode the content blocks of a packed request."""
+    content = []
+    for part in request:
+        content.extend(part.build())
+
+    return content
@@ -0,0 +1,288 @@
+import io
+import os
+import re
+import tempfile
+import subprocess
+
+from PIL import Image
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from metrics import stage
+
+
+# Maximum number of pages accepted per document
+MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "100"))
+
+# Width of the previews kept for display once a page has been released
+PREVIEW_WIDTH = 1200
+
+# Use the embedded text of born-digital PDF pages instead of OCR. Off by default:
+# struck-through text (e.g. tracked changes exported to PDF) stays in the text
+# layer, with nothing to tell it apart from the text that was kept
+TEXT_LAYER = os.getenv("OCR_TEXT_LAYER", "false").lower() == "true"
+
+# Minimum characters for an embedded text layer to be trusted
+MIN_TEXT_LAYER_CHARS = 100
+
+# Pages with an embedded image larger than this (in pixels, both sides) still go
+# through OCR, since their content is not in the text layer
+MIN_IMAGE_SIDE = 200
+
+# Pages with at least TABLE_MIN_ROWS text rows split into TABLE_MIN_CELLS or more
+# cells (words separated by a gap wider than CELL_GAP_EMS times the text height)
+# hold a table, which pdftotext would flatten: they still go through OCR
+TABLE_MIN_ROWS = 3
+TABLE_MIN_CELLS = 3
+CELL_GAP_EMS = 1.0
+
+WORD_BOX = re.compile(
+    r'<word xMin="([\d.]+)" yMin="([\d.]+)" xMax="([\d.]+)" yMax="([\d.]+)">'
+)
+
+
+class PageSource:
+    """
+    Lazy, rasterize-once view over the pages of an uploaded document.
+
+    Iterating renders one page at a time, so the caller can release each page as
+    soon as it is processed. A small JPEG preview of every rendered page is kept
+    in `previews` for display, which keeps memory flat as the page count grows.
+    Pages never rendered (e.g. served from the PDF text layer) get their preview
+    on first access.
+    """
+
+    def __init__(self, file_bytes: bytes, file_type: str, dpi: int = 200):
+        self.file_type = file_type
+        self.dpi = dpi
+        self.previews = Previews(self)
+        self._text_layer = None
+        self._image_pages = None
+        self._table_pages = None
+
+        if file_type == "application/pdf":
+            self._tmpdir = tempfile.TemporaryDirectory()
+            self._path = os.path.join(self._tmpdir.name, "document.pdf")
+
+            with open(self._path, "wb") as f:
+                f.write(file_bytes)
+
+            self.page_count = pdfinfo_from_path(self._path)["Pages"]
+            self._file_bytes = None
+        else:  # Assuming image type
+            self._tmpdir = None
+            self._path = None
+            self.page_count = 1
+            self._file_bytes = file_bytes
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def render(self, index: int) -> Image.Image:
+        """Rasterize a single page (0-based), keeping its preview."""
+        with stage("rasterize", page=index, dpi=self.dpi):
+            if self._path is None:
+                image = Image.open(io.BytesIO(self._file_bytes))
+                image.load()
+            else:
+                image = convert_from_path(
+                    self._path,
+                    dpi=self.dpi,
+                    first_page=index + 1,
+                    last_page=index + 1,
+                )[0]
+
+        self.previews.store(index, image)
+        return image
+
+    def iter_pages(self, indexes=None):
+        """Yield (index, image) for the given pages (all by default), one at a time."""
+        for index in range(self.page_count) if indexes is None else indexes:
+            yield index, self.render(index)
+
+    def __iter__(self):
+        for _, image in self.iter_pages():
+            yield image
+
+    def preview(self, index: int) -> bytes:
+        """Return the display preview of a page, rendering it if it was never seen."""
+        return self.previews[index]
+
+    def _run_poppler(self, command: list[str]) -> str:
+        result = subprocess.run(command, capture_output=True, check=True, timeout=120)
+        return result.stdout.decode("utf-8", errors="replace")
+
+    def text_layer(self) -> list[str]:
+        """Embedded text of every page (empty strings for images or on failure)."""
+        if self._text_layer is None:
+            self._text_layer = [""] * self.page_count
+
+            if self._path is not None:
+                with stage("text_layer", pages=self.page_count):
+                    try:
+                        output = self._run_poppler(
+                            ["pdftotext", "-enc", "UTF-8", self._path, "-"]
+                        )
+                    except (OSError, subprocess.SubprocessError):
+                        output = ""
+
+                # pdftotext separates pages with form feeds
+                for index, text in enumerate(output.split("\f")[: self.page_count]):
+                    self._text_layer[index] = text
+
+        return self._text_layer
+
+    def image_pages(self) -> set[int]:
+        """Pages (0-based) that embed an image of at least MIN_IMAGE_SIDE pixels."""
+        if self._image_pages is None:
+            if self._path is None:
+                self._image_pages = set()
+                return self._image_pages
+
+            try:
+                listing = self._run_poppler(["pdfimages", "-list", self._path])
+            except (OSError, subprocess.SubprocessError):
+                # Without the listing images cannot be ruled out on any page
+                self._image_pages = set(range(self.page_count))
+                return self._image_pages
+
+            self._image_pages = set()
+
+            # Columns: page num type width height ... (after two header lines)
+            for line in listing.splitlines()[2:]:
+                columns = line.split()
+                if len(columns) < 5 or not columns[0].isdigit():
+                    continue
+
+                if min(int(columns[3]), int(columns[4])) >= MIN_IMAGE_SIDE:
+                    self._image_pages.add(int(columns[0]) - 1)
+
+        return self._image_pages
+
+    def table_pages(self) -> set[int]:
+        """Pages (0-based) whose text layer is laid out as a table (see has_table)."""
+        if self._table_pages is None:
+            if self._path is None:
+                self._table_pages = set()
+                return self._table_pages
+
+            try:
+                with stage("text_layer_layout", pages=self.page_count):
+                    output = self._run_poppler(
+                        ["pdftotext", "-bbox", "-enc", "UTF-8", self._path, "-"]
+                    )
+            except (OSError, subprocess.SubprocessError):
+                # Without the word boxes tables cannot be ruled out on any page
+                self._table_pages = set(range(self.page_count))
+                return self._table_pages
+
+            pages = output.split("<page ")[1:]
+            self._table_pages = {
+                index for index, page in enumerate(pages) if has_table(word_boxes(page))
+            }
+
+        return self._table_pages
+
+    def native_text(self, index: int) -> str | None:
+        """
+        Usable embedded text of a page, or None when it must go through OCR
+        (scanned pages, pages with images or tables, or text layer disabled).
+        """
+        if not TEXT_LAYER or self._path is None:
+            return None
+
+        text = self.text_layer()[index]
+        if index in self.image_pages() or not is_usable_text(text):
+            return None
+
+        if index in self.table_pages():
+            return None
+
+        return text.strip()
+
+
+class Previews:
+    """Sequence of page previews, rendering missing ones on access."""
+
+    def __init__(self, source: PageSource):
+        self._source = source
+        self._previews: dict[int, bytes] = {}
+
+    def store(self, index: int, image: Image.Image) -> None:
+        if index not in self._previews:
+            self._previews[index] = make_preview(image)
+
+    def __len__(self) -> int:
+        return len(self._source)
+
+    def __getitem__(self, index: int) -> bytes:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+
+        if index not in self._previews:
+            self._source.render(index)
+
+        return self._previews[index]
+
+
+def is_usable_text(text: str) -> bool:
+    """Whether an embedded text layer looks like real text rather than noise."""
+    characters = "".join(text.split())
+    if len(characters) < MIN_TEXT_LAYER_CHARS:
+        return False
+
+    readable = sum(char.isalnum() for char in characters)
+    garbage = characters.count("\ufffd") + sum(
+        not char.isprintable() for char in characters
+    )
+
+    return readable / len(characters) >= 0.5 and garbage / len(characters) < 0.01
+
+
+def word_boxes(page: str) -> list[tuple[float, float, float, float]]:
+    """(x_min, y_min, x_max, y_max) of every word of a page of `pdftotext -bbox` output."""
+    return [tuple(map(float, box)) for box in WORD_BOX.findall(page)]
+
+
+def text_rows(words: list[tuple]) -> list[list[tuple]]:
+    """Words grouped into rows sharing a baseline, each sorted left to right."""
+    rows = []
+    for word in sorted(words, key=lambda box: (box[3], box[0])):
+        height = word[3] - word[1]
+        if rows and abs(rows[-1][0][3] - word[3]) <= height / 3:
+            rows[-1].append(word)
+        else:
+            rows.append([word])
+
+    return [sorted(row) for row in rows]
+
+
+def row_cells(row: list[tuple]) -> int:
+    """Number of cells of a row: runs of words separated by a gap wider than CELL_GAP_EMS."""
+    cells = 1
+    for previous, word in zip(row, row[1:]):
+        height = max(previous[3] - previous[1], word[3] - word[1])
+        if word[0] - previous[2] > CELL_GAP_EMS * height:
+            cells += 1
+
+    return cells
+
+
+def has_table(words: list[tuple]) -> bool:
+    """
+    Whether a page's words are laid out as a table: several rows split into
+    three or more cells. Justified prose and two-column layouts do not qualify;
+    three-column layouts do, and simply go through OCR.
+    """
+    rows = [row for row in text_rows(words) if row_cells(row) >= TABLE_MIN_CELLS]
+    return len(rows) >= TABLE_MIN_ROWS
+
+
+def make_preview(image: Image.Image, width: int = PREVIEW_WIDTH) -> bytes:
+    """Encode a downscaled JPEG copy of a page for display."""
+    preview = image.convert("RGB")
+    if preview.width > width:
+        preview.thumbnail((width, width * preview.height // preview.width))
+
+    buffered = io.BytesIO()
+    preview.save(buffered, format="JPEG", quality=85)
+    return buffered.getvalue()
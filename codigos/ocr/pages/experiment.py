@@ -1,69 +1,73 @@
 import os
-import base64
 
 import streamlit as st
 import pandas as pd
 
+from results_store import LEGACY_CSV_PATH, RESULTS_PATH, ResultsStore
+
 st.set_page_config(
     page_title="OCR Results Evaluation", 
     page_icon=":mag_right:", 
     layout="wide"
 )
 
-# Constants
-RESULTS_PATH = "codigos/ocr/data/ocr_results.csv"
 
-# Initialize session state
-if "ocr_responses" not in st.session_state:
-    st.session_state.ocr_responses = []
+@st.cache_resource
+def get_store() -> ResultsStore:
+    store = ResultsStore()
 
-# Load existing results if available
-if os.path.exists(RESULTS_PATH):
-    existing_results = pd.read_csv(RESULTS_PATH)
-    st.session_state.ocr_responses = existing_results.to_dict("records")
+    # One-time import of results written before the store existed
+    if store.version() == 0 and os.path.exists(LEGACY_CSV_PATH):
+        store.import_csv(LEGACY_CSV_PATH)
 
-st.title("OCR Results Evaluation")
+    return store
 
-# Results Analysis Section
-if st.session_state.ocr_responses:
-    st.markdown("## OCR Results Analysis")
-    results_df = pd.DataFrame(st.session_state.ocr_responses)
 
-    # Calculate accuracy per model
-    st.markdown("### Model Performance")
-    model_metrics = []
+# Queries are cached per store version, so reruns only hit SQLite after new
+# results are appended.
+
+
+@st.cache_data(max_entries=8)
+def model_metrics(version: int) -> pd.DataFrame:
+    return get_store().model_metrics()
 
-    for model_name in results_df["model_name"].unique():
-        model_df = results_df[results_df["model_name"] == model_name]
-        accuracy_df = model_df[model_df["accuracy_score"].notna()]
-        similarity_df = model_df[model_df["similarity_score"].notna()]
 
-        if len(accuracy_df) > 0:
-            accuracy = accuracy_df["accuracy_score"].mean()
-        else:
-            accuracy = None
+@st.cache_data(max_entries=32)
+def model_results(version: int, model_name: str) -> pd.DataFrame:
+    return get_store().model_results(
+        model_name,
+        [
+            "file_name",
+            "model_name",
+            "accuracy_score",
+            "similarity_score",
+            "cer",
+            "wer",
+            "explanation",
+            "cost",
+            "latency",
+        ],
+    )
 
-        if len(similarity_df) > 0:
-            similarity_score = similarity_df["similarity_score"].mean()
-        else:
-            similarity_score = None
 
-        total_samples = len(model_df)
-        evaluated_samples = len(accuracy_df)
+store = get_store()
+version = store.version()
 
-        # Calculate average cost
-        average_cost = model_df["cost"].mean() if "cost" in model_df.columns else 0.0
+st.title("OCR Results Evaluation")
 
-        model_metrics.append(
-            {
-                "Model": model_name,
-                "Similarity Score": similarity_score,
-                "Evaluated Samples": evaluated_samples,
-                "Average Cost": f"${average_cost:.5f}",
-            }
-        )
+# Results Analysis Section
+if version:
+    st.markdown("## OCR Results Analysis")
 
-    st.dataframe(pd.DataFrame(model_metrics), hide_index=True)
+    # Calculate accuracy per model
+    st.markdown("### Model Performance")
+    st.dataframe(
+        model_metrics(version),
+        hide_index=True,
+        column_config={
+            "Average Cost": st.column_config.NumberColumn(format="$%.5f"),
+        },
+    )
 
     st.divider()
 
@@ -71,26 +75,12 @@ if st.session_state.ocr_responses:
     st.markdown("## Detailed Results")
 
     # Filters
-    available_models = results_df["model_name"].unique()
-    selected_model = st.selectbox("Filter by Model", list(available_models))
-
-    # Apply filters
-    filtered_df = results_df.copy()
-    filtered_df = filtered_df[filtered_df["model_name"] == selected_model]
+    selected_model = st.selectbox("Filter by Model", store.models())
+    filtered_df = model_results(version, selected_model)
 
     # Display results
     st.markdown("### Results Table")
-    display_df = filtered_df[
-        [
-            "file_name",
-            "model_name",
-            "accuracy_score",
-            "similarity_score",
-            "explanation",
-            "cost",
-        ]
-    ]
-    st.dataframe(display_df, hide_index=True)
+    st.dataframe(filtered_df, hide_index=True)
 
     st.divider()
     st.markdown("## Detailed View")
@@ -101,14 +91,14 @@ if st.session_state.ocr_responses:
     )
 
     if selected_file:
-        file_result = filtered_df[filtered_df["file_name"] == selected_file].iloc[0]
+        file_result = store.result(selected_model, selected_file)
 
         # Show original image and extracted text
         col1, col2, col3 = st.columns(3)
         with col1:
             st.markdown("#### Original Image")
-            if file_result.get("image_data"):
-                img_bytes = base64.b64decode(file_result["image_data"])
+            img_bytes = store.image(file_result.get("image_hash"))
+            if img_bytes:
                 st.image(img_bytes)
             else:
                 st.info("Original image not available")
@@ -120,8 +110,8 @@ if st.session_state.ocr_responses:
         with col3:
             st.markdown("#### Evaluation")
             if file_result.get("accuracy_score") == 0:
-                st.markdown(file_result.get("evaluation_diff", "No evaluation available"))
+                st.markdown(file_result.get("evaluation_diff") or "No evaluation available")
             else:
                 st.success("No differences found")
 else:
-    st.info("No OCR results found. Please ensure the results CSV file exists at: " + RESULTS_PATH)
+    st.info("No OCR results found. Please ensure the results store exists at: " + RESULTS_PATH)
@@ -0,0 +1,79 @@
+import numpy as np
+
+from PIL import Image
+
+
+# Pages are analysed at this width, which is plenty for page statistics
+ANALYSIS_WIDTH = 800
+
+# Grayscale level under which a pixel counts as ink
+INK_THRESHOLD = 160
+
+# Pages darker than this on average are black pages, whose ink is light
+BLACK_MEAN_LEVEL = 40
+
+# Ink pixels with fewer ink neighbours than this are scan noise
+MIN_INK_NEIGHBOURS = 2
+
+# A pixel row with at least MIN_ROW_INK ink pixels is part of a text row when
+# MIN_TEXT_ROW_HEIGHT such rows follow each other. At ANALYSIS_WIDTH even a small
+# single line of text (a date, a signature caption) is taller than that.
+MIN_ROW_INK = 3
+MIN_TEXT_ROW_HEIGHT = 3
+
+
+def _grayscale(image: Image.Image) -> np.ndarray:
+    gray = image.convert("L")
+    if gray.width > ANALYSIS_WIDTH:
+        height = max(1, round(gray.height * ANALYSIS_WIDTH / gray.width))
+        gray = gray.resize((ANALYSIS_WIDTH, height), Image.BILINEAR)
+
+    return np.asarray(gray, dtype=np.uint8)
+
+
+def denoise(ink: np.ndarray) -> np.ndarray:
+    """Drop isolated ink pixels (specks), keeping strokes and their ends."""
+    padded = np.pad(ink, 1).astype(np.uint8)
+    height, width = ink.shape
+
+    neighbours = sum(
+        padded[1 + dy : 1 + dy + height, 1 + dx : 1 + dx + width]
+        for dy in (-1, 0, 1)
+        for dx in (-1, 0, 1)
+        if dy or dx
+    )
+    return ink & (neighbours >= MIN_INK_NEIGHBOURS)
+
+
+def has_text_rows(ink: np.ndarray) -> bool:
+    """Whether an ink mask holds at least one row of marks (text, lines, drawings)."""
+    rows = denoise(ink).sum(axis=1) >= MIN_ROW_INK
+
+    run = 0
+    for is_ink in rows:
+        run = run + 1 if is_ink else 0
+        if run >= MIN_TEXT_ROW_HEIGHT:
+            return True
+
+    return False
+
+
+def preclassify(image: Image.Image) -> list[str] | None:
+    """
+    Label a page locally when the answer is obvious.
+
+    Returns ["none"] only for empty pages: white (or black) pages without a
+    single row of marks once scan specks are removed. Every other page, down to
+    one line of text, needs the classification model and gets None. Layout
+    rules (ruled grids, picture regions) are not used: pages framed by a border,
+    maps and tables with headings or struck-through text all look like a single
+    grid to them.
+    """
+    gray = _grayscale(image)
+
+    if gray.mean() < BLACK_MEAN_LEVEL:
+        ink = gray >= INK_THRESHOLD
+    else:
+        ink = gray < INK_THRESHOLD
+
+    return None if has_text_rows(ink) else ["none"]
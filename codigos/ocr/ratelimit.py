@@ -0,0 +1,113 @@
+import os
+import time
+import asyncio
+import weakref
+import functools
+import contextvars
+
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _limit(provider: str, setting: str, default: int) -> int:
+    return int(os.getenv(f"OCR_{provider.upper()}_{setting}", str(default)))
+
+
+# Maximum concurrent requests and requests per minute for each provider.
+# Override with OCR_<PROVIDER>_CONCURRENCY / OCR_<PROVIDER>_RPM.
+PROVIDER_LIMITS = {
+    provider: {
+        "concurrency": _limit(provider, "CONCURRENCY", concurrency),
+        "rpm": _limit(provider, "RPM", rpm),
+    }
+    for provider, concurrency, rpm in [
+        ("openai", 16, 500),
+        ("anthropic", 8, 50),
+        ("mistral", 8, 360),
+        ("textract", 4, 600),
+    ]
+}
+
+
+class TokenBucket:
+    """Async token bucket: `rate` acquisitions per second, bursting up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        async with self._lock:
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+
+            self.tokens -= tokens
+
+
+class ProviderLimiter:
+    """Concurrency limit plus token bucket for a single provider."""
+
+    def __init__(self, concurrency: int, rpm: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # Bursts are capped so a cold start cannot fire a minute's worth at once
+        self.bucket = TokenBucket(rate=rpm / 60, capacity=max(1, concurrency))
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+
+# asyncio primitives are bound to one event loop, so limiters are kept per loop
+_LIMITERS = weakref.WeakKeyDictionary()
+
+
+def limiter(provider: str) -> ProviderLimiter:
+    """Return the limiter of `provider` for the running event loop."""
+    loop = asyncio.get_running_loop()
+    limiters = _LIMITERS.setdefault(loop, {})
+
+    if provider not in limiters:
+        limiters[provider] = ProviderLimiter(**PROVIDER_LIMITS[provider])
+
+    return limiters[provider]
+
+
+# Threads running blocking provider calls for the async API: one per slot of the
+# provider limiters, so a call the limiter lets through never waits for a thread
+# (the default executor has only min(32, CPUs + 4) of them)
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=sum(limits["concurrency"] for limits in PROVIDER_LIMITS.values()),
+    thread_name_prefix="provider",
+)
+
+
+async def run_limited(provider: str, func, *args, **kwargs):
+    """
+    Run the blocking provider call `func` in a thread once the limiter of
+    `provider` lets it through, keeping the caller's context (metrics).
+    """
+    async with limiter(provider):
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(_EXECUTOR, call)
@@ -0,0 +1,129 @@
+import time
+import random
+import asyncio
+import contextvars
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# Hedged calls run here rather than in a `with` pool: a pool would block until the
+# slow request finishes, which is exactly what hedging tries to avoid.
+HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+
+class ExtractionError(Exception):
+    """Raised when every attempt and fallback engine failed."""
+
+
+def _backoff(attempt: int, base_delay: float, max_delay: float) -> float:
+    delay = min(max_delay, base_delay * 2**attempt)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def retry(
+    func, *args, attempts: int = 3, base_delay: float = 1.0, max_delay: float = 10.0
+):
+    """Call `func(*args)`, retrying failures with exponential backoff and jitter."""
+    for attempt in range(attempts):
+        try:
+            return func(*args)
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+
+            time.sleep(_backoff(attempt, base_delay, max_delay))
+
+
+async def aretry(
+    func, *args, attempts: int = 3, base_delay: float = 1.0, max_delay: float = 10.0
+):
+    """Async version of retry."""
+    for attempt in range(attempts):
+        try:
+            return await func(*args)
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+
+            await asyncio.sleep(_backoff(attempt, base_delay, max_delay))
+
+
+def _submit(call):
+    # Keep the caller's context (metrics tags) in the hedge thread
+    return HEDGE_EXECUTOR.submit(contextvars.copy_context().run, call)
+
+
+def _rejected(result) -> ExtractionError:
+    return ExtractionError(f"Rejected result: {str(result)[:100]!r}")
+
+
+def hedged(calls: list, budget: float, accept=bool):
+    """
+    Return the first accepted result of `calls` (zero-argument callables).
+
+    The first call starts immediately. Each following call starts when the ones
+    already running have not produced an accepted result within `budget` seconds,
+    or as soon as all of them failed. Raises ExtractionError if every call fails.
+    """
+    remaining = list(calls)
+    pending = {_submit(remaining.pop(0))}
+    errors = []
+
+    while pending:
+        done, pending = wait(
+            pending,
+            timeout=budget if remaining else None,
+            return_when=FIRST_COMPLETED,
+        )
+
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+
+            if accept(result):
+                return result
+
+            errors.append(_rejected(result))
+
+        if remaining and (not done or not pending):
+            pending.add(_submit(remaining.pop(0)))
+
+    raise ExtractionError(f"All {len(calls)} engines failed: {errors}")
+
+
+async def ahedged(calls: list, budget: float, accept=bool):
+    """Async version of hedged. `calls` return awaitables; losers are cancelled."""
+    remaining = list(calls)
+    pending = {asyncio.ensure_future(remaining.pop(0)())}
+    errors = []
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=budget if remaining else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            for task in done:
+                try:
+                    result = task.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+
+                if accept(result):
+                    return result
+
+                errors.append(_rejected(result))
+
+            if remaining and (not done or not pending):
+                pending.add(asyncio.ensure_future(remaining.pop(0)()))
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise ExtractionError(f"All {len(calls)} engines failed: {errors}")
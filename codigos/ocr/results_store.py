@@ -0,0 +1,211 @@
+import os
+import base64
+import sqlite3
+import hashlib
+import threading
+
+import pandas as pd
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+RESULTS_PATH = os.getenv(
+    "OCR_RESULTS_PATH", os.path.join(DATA_DIR, "ocr_results.sqlite")
+)
+IMAGES_DIR = os.getenv("OCR_RESULTS_IMAGES_DIR", os.path.join(DATA_DIR, "images"))
+
+# Legacy results file, imported once into the store
+LEGACY_CSV_PATH = os.path.join(DATA_DIR, "ocr_results.csv")
+
+# Result columns and their SQLite types; images are stored as files by content hash
+COLUMNS = {
+    "file_name": "TEXT",
+    "model_name": "TEXT",
+    "extracted_text": "TEXT",
+    "accuracy_score": "REAL",
+    "similarity_score": "REAL",
+    "explanation": "TEXT",
+    "evaluation_diff": "TEXT",
+    "cost": "REAL",
+    "latency": "REAL",
+    "cer": "REAL",
+    "wer": "REAL",
+    "struck_leaked": "INTEGER",
+    "image_hash": "TEXT",
+}
+
+
+class ResultsStore:
+    """
+    Append-only SQLite store of OCR evaluation results.
+
+    Rows are only ever inserted, in batches. Page images are written once to
+    `images_dir` under their SHA-256 and referenced by `image_hash`, so the
+    table holds no base64 data and queries only read the columns they need.
+    """
+
+    def __init__(self, path: str = RESULTS_PATH, images_dir: str = IMAGES_DIR):
+        self.path = path
+        self.images_dir = images_dir
+
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY, {columns})"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_model ON results (model_name, file_name)"
+            )
+
+            # Stores created before a column was added get it as NULL
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}
+            for name, kind in COLUMNS.items():
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE results ADD COLUMN {name} {kind}")
+
+            self._conn.commit()
+
+        return self._conn
+
+    def save_image(self, image: bytes | str) -> str:
+        """Store image bytes (or base64) once under their content hash and return it."""
+        if isinstance(image, str):
+            image = base64.b64decode(image.split(",")[-1])
+
+        digest = hashlib.sha256(image).hexdigest()
+        path = os.path.join(self.images_dir, f"{digest}.img")
+
+        if not os.path.exists(path):
+            os.makedirs(self.images_dir, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(image)
+            os.replace(path + ".tmp", path)
+
+        return digest
+
+    def image(self, image_hash: str) -> bytes | None:
+        path = os.path.join(self.images_dir, f"{image_hash}.img")
+        if not image_hash or not os.path.exists(path):
+            return None
+
+        with open(path, "rb") as f:
+            return f.read()
+
+    def append(self, records) -> int:
+        """
+        Insert result records (dicts with COLUMNS keys) in one transaction.
+
+        An `image_data` value (bytes or base64) is moved to the image store.
+        Returns the number of inserted rows.
+        """
+        rows = []
+        for record in records:
+            record = dict(record)
+            image = record.pop("image_data", None)
+            if isinstance(image, (bytes, str)) and image:
+                record["image_hash"] = self.save_image(image)
+
+            rows.append(tuple(_value(record.get(name)) for name in COLUMNS))
+
+        if not rows:
+            return 0
+
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self._lock:
+            self.conn.executemany(
+                f"INSERT INTO results ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                rows,
+            )
+            self.conn.commit()
+
+        return len(rows)
+
+    def import_csv(self, path: str = LEGACY_CSV_PATH, chunksize: int = 10_000) -> int:
+        """Append the rows of a legacy ocr_results.csv, reading it in chunks."""
+        total = 0
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            total += self.append(chunk.to_dict("records"))
+
+        return total
+
+    def version(self) -> int:
+        """Changes whenever rows are appended (used to invalidate cached queries)."""
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM results").fetchone()[0]
+
+    def query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        with self._lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def model_metrics(self) -> pd.DataFrame:
+        """
+        One row per model, aggregated by SQLite in a single group-by. Failed runs
+        ("Error: ..." explanation) are counted but left out of cost and latency.
+        """
+        return self.query(
+            """
+            SELECT
+                model_name AS "Model",
+                AVG(similarity_score) AS "Similarity Score",
+                AVG(accuracy_score) AS "Accuracy Score",
+                AVG(cer) AS "CER",
+                AVG(wer) AS "WER",
+                SUM(struck_leaked) AS "Struck Text Leaked",
+                COUNT(accuracy_score) AS "Evaluated Samples",
+                COUNT(*) AS "Total Samples",
+                SUM(explanation LIKE 'Error:%') AS "Errors",
+                AVG(CASE WHEN explanation LIKE 'Error:%' THEN NULL ELSE cost END)
+                    AS "Average Cost",
+                AVG(CASE WHEN explanation LIKE 'Error:%' THEN NULL ELSE latency END)
+                    AS "Average Latency (s)"
+            FROM results
+            GROUP BY model_name
+            ORDER BY model_name
+            """
+        )
+
+    def models(self) -> list[str]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT model_name FROM results ORDER BY model_name"
+            ).fetchall()
+
+        return [row[0] for row in rows]
+
+    def model_results(self, model_name: str, columns: list[str]) -> pd.DataFrame:
+        """The given columns of every result of a model."""
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown result columns: {sorted(unknown)}")
+
+        return self.query(
+            f"SELECT {', '.join(columns)} FROM results WHERE model_name = ? ORDER BY id",
+            (model_name,),
+        )
+
+    def result(self, model_name: str, file_name: str) -> dict | None:
+        """The first result of a model for a file, with every column."""
+        frame = self.query(
+            "SELECT * FROM results WHERE model_name = ? AND file_name = ? "
+            "ORDER BY id LIMIT 1",
+            (model_name, file_name),
+        )
+
+        return frame.iloc[0].to_dict() if len(frame) else None
+
+
+def _value(value):
+    """NaN (from pandas) and other missing values become NULL."""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+
+    return value
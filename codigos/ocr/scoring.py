@@ -0,0 +1,159 @@
+import os
+import re
+
+import numpy as np
+
+from cache import OCRCache, content_digest
+
+
+SCORE_CACHE = OCRCache(
+    path=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "data", "score_cache.sqlite"
+    ),
+    max_entries=1_000_000,
+)
+
+# Bump when the metrics change, so cached scores are recomputed
+SCORER_VERSION = 1
+
+# Pairs scored together by the batched edit-distance kernel
+BATCH_SIZE = 256
+
+# Struck-through text is written ~~like this~~ in ground truth files
+STRIKE_PATTERN = re.compile(r"~~(.+?)~~", re.DOTALL)
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def edit_distances(pairs: list[tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+    """
+    Levenshtein distance of each (source, target) pair of integer sequences.
+
+    Pairs are grouped by length and each group is computed at once: the dynamic
+    programming table is filled one source position at a time for every pair of
+    the group, with the insertion chain resolved by a cumulative minimum.
+    """
+    distances = np.zeros(len(pairs), dtype=np.int64)
+    order = sorted(
+        range(len(pairs)), key=lambda i: (len(pairs[i][0]), len(pairs[i][1]))
+    )
+
+    for start in range(0, len(order), BATCH_SIZE):
+        group = order[start : start + BATCH_SIZE]
+        distances[group] = _edit_distance_group([pairs[i] for i in group])
+
+    return distances
+
+
+def _edit_distance_group(pairs: list[tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+    source_lengths = np.array([len(source) for source, _ in pairs])
+    target_lengths = np.array([len(target) for _, target in pairs])
+    rows, columns = source_lengths.max(initial=0), target_lengths.max(initial=0)
+
+    # Padding values never match each other or a real token
+    sources = np.full((len(pairs), rows), -1, dtype=np.int64)
+    targets = np.full((len(pairs), columns), -2, dtype=np.int64)
+    for index, (source, target) in enumerate(pairs):
+        sources[index, : len(source)] = source
+        targets[index, : len(target)] = target
+
+    positions = np.arange(columns + 1)
+    previous = np.tile(positions, (len(pairs), 1))
+    result = previous[np.arange(len(pairs)), target_lengths].copy()
+
+    for i in range(rows):
+        cost = (sources[:, i : i + 1] != targets).astype(np.int64)
+        current = np.empty_like(previous)
+        current[:, 0] = i + 1
+        current[:, 1:] = np.minimum(previous[:, 1:] + 1, previous[:, :-1] + cost)
+        current = np.minimum.accumulate(current - positions, axis=1) + positions
+
+        finished = source_lengths == i + 1
+        result[finished] = current[finished, target_lengths[finished]]
+        previous = current
+
+    return result
+
+
+def _tokens(texts: list[str], words: bool) -> list[np.ndarray]:
+    """Integer sequences of characters (code points) or words (shared vocabulary ids)."""
+    if not words:
+        return [
+            np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+            for text in texts
+        ]
+
+    vocabulary = {}
+    return [
+        np.array(
+            [vocabulary.setdefault(word, len(vocabulary)) for word in text.split()],
+            dtype=np.int64,
+        )
+        for text in texts
+    ]
+
+
+def strike_check(extracted: str, reference: str) -> tuple[int, int]:
+    """
+    (struck-through phrases in the reference, how many of them leaked into the
+    extracted text).
+    """
+    struck = [normalize(phrase).lower() for phrase in STRIKE_PATTERN.findall(reference)]
+    extracted = normalize(extracted).lower()
+    return len(struck), sum(bool(phrase) and phrase in extracted for phrase in struck)
+
+
+def _score_key(extracted: str, reference: str) -> str:
+    return SCORE_CACHE.make_key(
+        extracted, reference=content_digest(reference), version=SCORER_VERSION
+    )
+
+
+def score_texts(extracted: list[str], references: list[str]) -> list[dict]:
+    """
+    Score extracted texts against their references.
+
+    Each score holds cer and wer (edit distance over the reference length, in
+    characters and words), similarity (1 minus the character edit distance over
+    the longer text), the number of struck-through reference phrases (written
+    ~~like this~~ and excluded from the other metrics) and how many of them
+    leaked into the extraction. Scores are cached per (text, reference) hash.
+    """
+    scores = [
+        SCORE_CACHE.get(_score_key(text, reference))
+        for text, reference in zip(extracted, references)
+    ]
+    missing = [index for index, score in enumerate(scores) if score is None]
+    if not missing:
+        return scores
+
+    texts = [normalize(extracted[index]) for index in missing]
+    refs = [normalize(STRIKE_PATTERN.sub(" ", references[index])) for index in missing]
+
+    char_distances = edit_distances(
+        list(zip(_tokens(texts, words=False), _tokens(refs, words=False)))
+    )
+    word_tokens = _tokens(texts + refs, words=True)
+    word_distances = edit_distances(
+        list(zip(word_tokens[: len(texts)], word_tokens[len(texts) :]))
+    )
+
+    for position, index in enumerate(missing):
+        text, ref = texts[position], refs[position]
+        struck, leaked = strike_check(extracted[index], references[index])
+        reference_words = len(word_tokens[len(texts) + position])
+
+        scores[index] = {
+            "cer": float(char_distances[position]) / max(len(ref), 1),
+            "wer": float(word_distances[position]) / max(reference_words, 1),
+            "similarity": 1.0
+            - float(char_distances[position]) / max(len(text), len(ref), 1),
+            "word_errors": int(word_distances[position]),
+            "struck": struck,
+            "struck_leaked": leaked,
+        }
+        SCORE_CACHE.set(_score_key(extracted[index], references[index]), scores[index])
+
+    return scores
@@ -0,0 +1,95 @@
+from html.parser import HTMLParser
+
+
+# Largest share of empty cells accepted in a table
+MAX_EMPTY_CELLS = 0.5
+
+
+class TableParser(HTMLParser):
+    """Collect the rows of every <table> as lists of (text, colspan, rowspan) cells."""
+
+    def __init__(self):
+        super().__init__()
+        self.tables = []
+        self._depth = 0
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+
+        if tag == "table":
+            self._depth += 1
+            if self._depth == 1:
+                self.tables.append([])
+        elif self._depth != 1:
+            return
+        elif tag == "tr":
+            self.tables[-1].append([])
+        elif tag in ("td", "th") and self.tables[-1]:
+            self._cell = [[], _span(attrs.get("colspan")), _span(attrs.get("rowspan"))]
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            self._depth = max(0, self._depth - 1)
+        elif tag in ("td", "th") and self._cell is not None and self._depth == 1:
+            text, colspan, rowspan = self._cell
+            self.tables[-1][-1].append(("".join(text).strip(), colspan, rowspan))
+            self._cell = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell[0].append(data)
+
+
+def _span(value) -> int:
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 1
+
+
+def row_widths(rows: list[list[tuple]]) -> list[int]:
+    """Number of grid columns each row covers, counting colspans and rowspans from above."""
+    widths = []
+    carried = {}  # row index -> columns taken by rowspans from earlier rows
+
+    for index, row in enumerate(rows):
+        width = carried.pop(index, 0)
+        for _, colspan, rowspan in row:
+            width += colspan
+            for below in range(index + 1, index + rowspan):
+                carried[below] = carried.get(below, 0) + colspan
+
+        widths.append(width)
+
+    return widths
+
+
+def table_problems(html: str) -> list[str]:
+    """
+    Structural problems of the HTML tables in a model answer (empty if none).
+
+    Checks that there is at least one table, that every row of a table spans
+    the same number of columns and that most cells have text.
+    """
+    parser = TableParser()
+    parser.feed(html if isinstance(html, str) else "")
+    parser.close()
+
+    tables = [[row for row in table if row] for table in parser.tables]
+    tables = [table for table in tables if table]
+    if not tables:
+        return ["no table found"]
+
+    problems = []
+    for number, rows in enumerate(tables, start=1):
+        widths = row_widths(rows)
+        if len(set(widths)) > 1:
+            problems.append(f"table {number}: rows span {sorted(set(widths))} columns")
+
+        cells = [text for row in rows for text, _, _ in row]
+        empty = sum(not text for text in cells) / len(cells)
+        if empty > MAX_EMPTY_CELLS:
+            problems.append(f"table {number}: {empty:.0%} of the cells are empty")
+
+    return problems
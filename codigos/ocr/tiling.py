@@ -0,0 +1,134 @@
+import os
+import re
+import math
+import difflib
+
+import numpy as np
+
+from PIL import Image
+
+
+# Extract text tile by tile (OCR_TILING) when the page has several columns
+# or its longest side exceeds OCR_TILE_TRIGGER_SIDE pixels
+TILING = os.getenv("OCR_TILING", "false").lower() == "true"
+TILE_TRIGGER_SIDE = int(os.getenv("OCR_TILE_TRIGGER_SIDE", "3000"))
+
+# Largest tile side, matching what Anthropic uses without downscaling
+TILE_SIZE = 1568
+
+# Overlap between neighbouring tiles, so every line is whole in at least one tile
+TILE_OVERLAP = 120
+
+# A vertical band this wide (at page resolution) with no ink separates two columns
+MIN_GUTTER_WIDTH = 30
+
+# Lines compared when looking for the text shared by two neighbouring tiles
+STITCH_WINDOW = 12
+
+
+def needs_tiling(image: Image.Image) -> bool:
+    """Whether a page is too large, or too dense, to be sent whole."""
+    return max(image.size) > TILE_TRIGGER_SIDE or len(find_columns(image)) > 1
+
+
+def find_columns(image: Image.Image) -> list[tuple[int, int]]:
+    """
+    Horizontal spans (x0, x1) of the text columns of a page, left to right.
+
+    Columns are separated by gutters: vertical bands without ink across the
+    middle 80% of the page height.
+    """
+    gray = np.asarray(image.convert("L"), dtype=np.uint8)
+    height, width = gray.shape
+    body = gray[int(height * 0.1) : int(height * 0.9)]
+
+    empty = (body < 160).mean(axis=0) < 0.001
+    columns = []
+    start = None
+    gutter = 0
+
+    for x, is_empty in enumerate(empty):
+        if not is_empty:
+            if start is None:
+                start = x
+            gutter = 0
+        elif start is not None:
+            gutter += 1
+            if gutter >= MIN_GUTTER_WIDTH:
+                columns.append((start, x - gutter + 1))
+                start = None
+                gutter = 0
+
+    if start is not None:
+        columns.append((start, width))
+
+    if len(columns) <= 1:
+        return [(0, width)]
+
+    # Give each column the surrounding whitespace back, up to the middle of the gutters
+    edges = [0] + [(left[1] + right[0]) // 2 for left, right in zip(columns, columns[1:])]
+    return list(zip(edges, edges[1:] + [width]))
+
+
+def _spans(length: int, size: int, overlap: int) -> list[tuple[int, int]]:
+    if length <= size:
+        return [(0, length)]
+
+    count = math.ceil((length - overlap) / (size - overlap))
+    step = (length - size) / (count - 1)
+    return [(round(i * step), round(i * step) + size) for i in range(count)]
+
+
+def split_tiles(
+    image: Image.Image, size: int = TILE_SIZE, overlap: int = TILE_OVERLAP
+) -> list[Image.Image]:
+    """
+    Split a page into overlapping tiles of at most `size` pixels, in reading order:
+    column by column, and top to bottom inside each column.
+
+    Tiles always span the whole width of their column, so every tile holds
+    whole lines; a column wider than `size` is downscaled to fit instead of
+    being cut into side-by-side tiles, whose texts could not be joined in order.
+    """
+    tiles = []
+    for x0, x1 in find_columns(image):
+        column = image.crop((x0, 0, x1, image.height))
+        if column.width > size:
+            height = max(1, round(column.height * size / column.width))
+            column = column.resize((size, height), Image.LANCZOS)
+
+        for top, bottom in _spans(column.height, size, overlap):
+            tiles.append(column.crop((0, top, column.width, bottom)))
+
+    return tiles
+
+
+def _normalize(line: str) -> str:
+    return re.sub(r"\W+", "", line).lower()
+
+
+def stitch_texts(texts: list[str]) -> str:
+    """
+    Join tile texts in order, dropping the lines repeated in the overlap between
+    neighbouring tiles (and the cut lines around them).
+    """
+    lines = []
+    for text in texts:
+        incoming = text.strip().splitlines()
+        if not lines:
+            lines = incoming
+            continue
+
+        tail = [_normalize(line) for line in lines[-STITCH_WINDOW:]]
+        head = [_normalize(line) for line in incoming[:STITCH_WINDOW]]
+
+        matcher = difflib.SequenceMatcher(None, tail, head, autojunk=False)
+        match = matcher.find_longest_match(0, len(tail), 0, len(head))
+
+        if match.size and any(tail[match.a : match.a + match.size]):
+            keep = len(lines) - len(tail) + match.a + match.size
+            lines = lines[:keep] + incoming[match.b + match.size :]
+        else:
+            lines = lines + incoming
+
+    return "\n".join(lines)